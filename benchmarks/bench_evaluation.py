@@ -0,0 +1,81 @@
+import os
+import tempfile
+from subpred.go_prediction import (
+    get_model_evaluation_matrix_parallel,
+    process_pairwise_eval_results,
+)
+from subpred.go_redundancy import subset_pipeline
+from .common import (
+    create_data_folder,
+    get_transporter_dataset,
+    get_largest_terms,
+    WORKING_FOLDER,
+)
+
+
+class PairwiseEvaluation:
+    # peakmem only includes the main process, not the worker processes of the evaluation
+    params = [100, 300]
+    param_names = ["n_proteins"]
+    timeout = 1200
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, n_proteins):
+        self.previous_folder = os.getcwd()
+        df_sequences, df_uniprot_goa, _ = get_transporter_dataset(data_folder)
+        proteins = (
+            df_sequences.index.to_series().sample(n_proteins, random_state=1).tolist()
+        )
+        df_uniprot_goa = df_uniprot_goa[df_uniprot_goa.Uniprot.isin(proteins)]
+        # three labels, the root is annotated to all proteins
+        labels = get_largest_terms(df_uniprot_goa, 3, exclude={"GO:0022857"})
+        self.df_uniprot_goa = df_uniprot_goa[
+            df_uniprot_goa.go_id_ancestor.isin(labels)
+        ]
+        self.df_sequences = df_sequences.loc[self.df_uniprot_goa.Uniprot.unique()]
+        # calculate_features reads the PSSM files from the default folders
+        os.chdir(f"{data_folder}/{WORKING_FOLDER}")
+
+    def teardown(self, data_folder, n_proteins):
+        os.chdir(self.previous_folder)
+
+    def __evaluate(self):
+        pairwise_eval_results = get_model_evaluation_matrix_parallel(
+            self.df_sequences,
+            self.df_uniprot_goa,
+            exclude_iea=False,
+            model_name="svc_multi",
+            n_jobs=1,
+        )
+        process_pairwise_eval_results(pairwise_eval_results, self.df_uniprot_goa)
+
+    def time_pairwise_evaluation(self, data_folder, n_proteins):
+        self.__evaluate()
+
+    def peakmem_pairwise_evaluation(self, data_folder, n_proteins):
+        self.__evaluate()
+
+
+class SubsetPipeline:
+    # the whole pipeline with its default parameters, on all transporters of a smaller synthetic dataset
+    timeout = 1200
+
+    def setup_cache(self):
+        return create_data_folder(n_proteins=2000, n_go_terms=3000)
+
+    def setup(self, data_folder):
+        self.previous_folder = os.getcwd()
+        self.df_sequences, self.df_uniprot_goa, _ = get_transporter_dataset(data_folder)
+        os.chdir(f"{data_folder}/{WORKING_FOLDER}")
+
+    def teardown(self, data_folder):
+        os.chdir(self.previous_folder)
+
+    def time_subset_pipeline(self, data_folder):
+        # empty cache folder, otherwise the pairwise results of the previous run are reused
+        with tempfile.TemporaryDirectory() as cache_folder:
+            subset_pipeline(
+                self.df_uniprot_goa, self.df_sequences, cache_folder=cache_folder
+            )
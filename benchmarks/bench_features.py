@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from subpred import pssm
+from subpred.compositions import calculate_comp
+from subpred.synthetic_data import write_stub_pssm_files, AMINO_ACID_FREQUENCIES
+from .common import create_data_folder, load_synthetic_df
+
+# double underscore names are mangled inside of classes
+process_pssm_file = getattr(pssm, "__process_pssm_file")
+
+
+class Compositions:
+    params = ([1, 2], [1000, 10000])
+    param_names = ["k", "n_sequences"]
+
+    def setup_cache(self):
+        return create_data_folder(n_proteins=10000)
+
+    def setup(self, data_folder, k, n_sequences):
+        self.sequences = load_synthetic_df(data_folder, "uniprot").sequence.iloc[
+            :n_sequences
+        ]
+
+    def time_calculate_comp(self, data_folder, k, n_sequences):
+        calculate_comp(self.sequences, k=k, n_threads=1)
+
+    def peakmem_calculate_comp(self, data_folder, k, n_sequences):
+        calculate_comp(self.sequences, k=k, n_threads=1)
+
+
+class ProcessPssmFile:
+    params = [100, 1000, 5000]
+    param_names = ["sequence_length"]
+
+    def setup_cache(self):
+        rng = np.random.default_rng(1)
+        sequences = pd.Series(
+            {
+                f"P{length}": "".join(
+                    rng.choice(list(pssm.PSSM_AA_ORDER), size=length, p=AMINO_ACID_FREQUENCIES)
+                )
+                for length in self.params
+            }
+        )
+        write_stub_pssm_files(sequences, "pssm")
+        return sequences.to_dict()
+
+    def setup(self, sequences, sequence_length):
+        self.pssm_file_name = f"pssm/P{sequence_length}.pssm"
+        self.sequence = sequences[f"P{sequence_length}"]
+
+    def time_process_pssm_file(self, sequences, sequence_length):
+        process_pssm_file(self.pssm_file_name, self.sequence)
+
+    def peakmem_process_pssm_file(self, sequences, sequence_length):
+        process_pssm_file(self.pssm_file_name, self.sequence)
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+from subpred import go_annotations
+from subpred.go_annotations import get_go_subgraph, get_go_levels
+from subpred.go_protein_index import GoProteinIndex
+from subpred.go_redundancy import optimize_subset
+from subpred.overlap_matrix import get_go_overlap_matrix
+from .common import (
+    create_data_folder,
+    load_synthetic_df,
+    get_transporter_dataset,
+    get_largest_terms,
+)
+
+# double underscore names are mangled inside of classes
+add_ancestors = getattr(go_annotations, "__add_ancestors")
+
+
+def get_molecular_function_annotations(data_folder: str, n_proteins: int):
+    # annotations of the first n_proteins proteins with all molecular function terms, and the is_a subgraph
+    graph_go = load_synthetic_df(data_folder, "go_obo")
+    graph_go_subgraph = get_go_subgraph(graph_go, root_node="GO:0003674")
+    df_go = load_synthetic_df(data_folder, "go")
+    proteins = df_go.Uniprot.drop_duplicates().iloc[:n_proteins]
+    df_uniprot_goa = df_go[
+        df_go.Uniprot.isin(proteins)
+        & (df_go.qualifier == "enables")
+        & df_go.go_id.isin(graph_go_subgraph.nodes())
+    ].reset_index(drop=True)
+    return df_uniprot_goa, graph_go_subgraph
+
+
+def get_annotations_with_ancestors(df_uniprot_goa, graph_go):
+    # same result as __add_ancestors, with the ancestors of each term calculated once
+    go_id_to_ancestors = {
+        go_id: {go_id} | nx.descendants(graph_go, go_id)
+        for go_id in df_uniprot_goa.go_id.unique()
+    }
+    return (
+        df_uniprot_goa.assign(go_id_ancestor=df_uniprot_goa.go_id.map(go_id_to_ancestors))
+        .explode("go_id_ancestor")
+        .reset_index(drop=True)
+    )
+
+
+class AddAncestors:
+    params = [1000, 5000]
+    param_names = ["n_proteins"]
+    timeout = 600
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, n_proteins):
+        self.df_uniprot_goa, self.graph_go = get_molecular_function_annotations(
+            data_folder, n_proteins
+        )
+
+    def time_add_ancestors(self, data_folder, n_proteins):
+        add_ancestors(self.df_uniprot_goa, self.graph_go)
+
+    def peakmem_add_ancestors(self, data_folder, n_proteins):
+        add_ancestors(self.df_uniprot_goa, self.graph_go)
+
+
+class OverlapMatrix:
+    params = [2000, 20000]
+    param_names = ["n_proteins"]
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, n_proteins):
+        self.df_uniprot_goa = get_annotations_with_ancestors(
+            *get_molecular_function_annotations(data_folder, n_proteins)
+        )
+
+    def time_get_go_overlap_matrix(self, data_folder, n_proteins):
+        get_go_overlap_matrix(self.df_uniprot_goa, exclude_iea=False)
+
+    def peakmem_get_go_overlap_matrix(self, data_folder, n_proteins):
+        get_go_overlap_matrix(self.df_uniprot_goa, exclude_iea=False)
+
+
+class OptimizeSubset:
+    params = (["greedy", "beam"], [20, 50])
+    param_names = ["solver", "n_terms"]
+    timeout = 300
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, solver, n_terms):
+        _, df_uniprot_goa, _ = get_transporter_dataset(data_folder)
+        self.go_terms_list = get_largest_terms(
+            df_uniprot_goa, n_terms, exclude={"GO:0022857"}
+        )
+        # pairwise test scores as from process_pairwise_eval_results, with some pairs that could not be evaluated
+        rng = np.random.default_rng(1)
+        scores = rng.uniform(0.5, 1.0, size=(n_terms, n_terms))
+        scores[rng.random(scores.shape) < 0.1] = np.nan
+        self.df_test_scores = pd.DataFrame(
+            scores, index=self.go_terms_list, columns=self.go_terms_list
+        )
+        self.go_id_to_proteins = GoProteinIndex.from_annotations(df_uniprot_goa)
+        self.go_id_to_level = (
+            get_go_levels(load_synthetic_df(data_folder, "go_obo"))
+            .min_level.loc[self.go_terms_list]
+            .to_dict()
+        )
+
+    def __optimize_subset(self, solver):
+        optimize_subset(
+            self.go_terms_list,
+            self.df_test_scores,
+            self.go_id_to_proteins,
+            self.go_id_to_level,
+            verbose=False,
+            solver=solver,
+        )
+
+    def time_optimize_subset(self, data_folder, solver, n_terms):
+        self.__optimize_subset(solver)
+
+    def peakmem_optimize_subset(self, data_folder, solver, n_terms):
+        self.__optimize_subset(solver)
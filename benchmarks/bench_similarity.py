@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+from .common import (
+    create_data_folder,
+    get_transporter_dataset,
+    get_largest_terms,
+    WORKING_FOLDER,
+)
+
+
+class PairwiseGoScores:
+    params = ([20, 50], ["mean", "median"])
+    param_names = ["n_terms", "aggr_method"]
+    timeout = 300
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, n_terms, aggr_method):
+        # sequence_identity needs rpy2, benchmarks are skipped without it
+        try:
+            from subpred.sequence_identity import get_pairwise_go_scores
+        except ImportError:
+            raise NotImplementedError
+        self.get_pairwise_go_scores = get_pairwise_go_scores
+        _, df_uniprot_goa, _ = get_transporter_dataset(data_folder)
+        self.go_terms = np.array(get_largest_terms(df_uniprot_goa, n_terms))
+        df_uniprot_goa = df_uniprot_goa[df_uniprot_goa.go_id_ancestor.isin(self.go_terms)]
+        # same format as in get_aggregated_sequence_alignments_go
+        self.go_to_proteins_arr = (
+            df_uniprot_goa[["Uniprot", "go_id_ancestor"]]
+            .groupby("go_id_ancestor")
+            .apply(lambda x: np.sort(x.Uniprot.unique().to_numpy()))
+        )
+        # sequence identities of all pairs of proteins, as from get_pairwise_sequence_identities
+        proteins = np.sort(df_uniprot_goa.Uniprot.unique())
+        rng = np.random.default_rng(1)
+        identities = rng.uniform(0, 100, size=(len(proteins), len(proteins)))
+        identities = (identities + identities.T) / 2
+        np.fill_diagonal(identities, 100)
+        self.df_protein_scores = pd.DataFrame(identities, index=proteins, columns=proteins)
+
+    def time_get_pairwise_go_scores(self, data_folder, n_terms, aggr_method):
+        self.get_pairwise_go_scores(
+            self.go_terms, self.go_to_proteins_arr, self.df_protein_scores, aggr_method
+        )
+
+    def peakmem_get_pairwise_go_scores(self, data_folder, n_terms, aggr_method):
+        self.get_pairwise_go_scores(
+            self.go_terms, self.go_to_proteins_arr, self.df_protein_scores, aggr_method
+        )
+
+
+class PairwiseChemicalSimilarity:
+    params = ["morgan", "maccs"]
+    param_names = ["fingerprint_method"]
+    timeout = 300
+
+    def setup_cache(self):
+        return create_data_folder()
+
+    def setup(self, data_folder, fingerprint_method):
+        self.previous_folder = os.getcwd()
+        # chemical_similarity needs rdkit, benchmarks are skipped without it
+        try:
+            from subpred.chemical_similarity import get_pairwise_similarity
+        except ImportError:
+            raise NotImplementedError
+        self.get_pairwise_similarity = get_pairwise_similarity
+        _, _, self.df_go_chebi = get_transporter_dataset(data_folder)
+        # get_pairwise_similarity reads chebi_obo from the default folder
+        os.chdir(f"{data_folder}/{WORKING_FOLDER}")
+
+    def teardown(self, data_folder, fingerprint_method):
+        os.chdir(self.previous_folder)
+
+    def time_get_pairwise_similarity(self, data_folder, fingerprint_method):
+        self.get_pairwise_similarity(self.df_go_chebi, fingerprint_method=fingerprint_method)
+
+    def peakmem_get_pairwise_similarity(self, data_folder, fingerprint_method):
+        self.get_pairwise_similarity(self.df_go_chebi, fingerprint_method=fingerprint_method)
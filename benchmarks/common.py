@@ -0,0 +1,56 @@
+import os
+import pandas as pd
+from subpred.synthetic_data import create_synthetic_datasets
+from subpred.transmembrane_transporters import get_transmembrane_transporter_dataset
+from subpred.util import load_df
+
+# The benchmarks run on synthetic data in the folder layout of the repository:
+# data/datasets, data/intermediate/blast (stub PSSM files of all transporters), and notebooks as working directory,
+# such that the default paths of subpred ("../data/...") point to the synthetic data.
+DATASETS_FOLDER = "data/datasets"
+BLAST_FOLDER = "data/intermediate/blast"
+WORKING_FOLDER = "notebooks"
+
+
+def create_data_folder(n_proteins: int = 20000, n_go_terms: int = 10000) -> str:
+    """Writes the synthetic datasets into the current directory, for setup_cache of the benchmarks.
+    asv runs all benchmarks of a class in the directory of setup_cache.
+
+    Returns:
+        str: absolute path of the folder, passed to setup and the benchmarks by asv
+    """
+    create_synthetic_datasets(
+        DATASETS_FOLDER,
+        n_proteins=n_proteins,
+        n_go_terms=n_go_terms,
+        n_chebi_terms=2000,
+        random_seed=1,
+        pssm_folder_path=BLAST_FOLDER,
+        verbose=False,
+    )
+    os.makedirs(WORKING_FOLDER, exist_ok=True)
+    return os.path.abspath(".")
+
+
+def load_synthetic_df(data_folder: str, dataset_name: str):
+    return load_df(dataset_name, folder_path=f"{data_folder}/{DATASETS_FOLDER}")
+
+
+def get_transporter_dataset(data_folder: str):
+    """Output of get_transmembrane_transporter_dataset for all synthetic proteins"""
+    return get_transmembrane_transporter_dataset(
+        datasets_path=f"{data_folder}/{DATASETS_FOLDER}",
+        max_sequence_evidence_code=2,
+    )
+
+
+def get_largest_terms(df_uniprot_goa: pd.DataFrame, n_terms: int, exclude: set = None) -> list:
+    # GO terms (including ancestors) with the most proteins, sorted by identifier
+    protein_counts = (
+        df_uniprot_goa[["Uniprot", "go_id_ancestor"]]
+        .drop_duplicates()
+        .go_id_ancestor.value_counts()
+    )
+    if exclude:
+        protein_counts = protein_counts.drop(exclude, errors="ignore")
+    return sorted(protein_counts.index[:n_terms])
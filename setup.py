@@ -2,7 +2,7 @@ from setuptools import find_packages, setup
 
 setup(
     name='subpred',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     version='2.0.0',
     description='Functions for creating and analyzing membrane transport protein datasets',
     author='Andreas Denger',
@@ -1,5 +1,6 @@
 import numpy as np
-from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.base import BaseEstimator, TransformerMixin, ClassifierMixin
+from sklearn.svm import SVC
 import re
 from sklearn.feature_selection import SelectorMixin
 from sklearn.compose import (
@@ -75,6 +76,70 @@ class FeatureCombinator(BaseEstimator, SelectorMixin):
         return self
 
 
+class PrecomputedScores:
+    # score_func for SelectPercentile/SelectKBest that returns feature scores that were calculated beforehand,
+    # e.g. once per cross validation fold instead of once per parameter combination
+    def __init__(self, scores: np.array, pvalues: np.array = None):
+        self.scores = scores
+        self.pvalues = pvalues
+
+    def __call__(self, X, y):
+        return self.scores, self.pvalues
+
+
+# memory mapped kernel matrices in the current process, by file path
+KERNEL_MATRICES = dict()
+
+
+def load_kernel_matrix(kernel_path: str):
+    if kernel_path not in KERNEL_MATRICES:
+        KERNEL_MATRICES[kernel_path] = np.load(kernel_path, mmap_mode="r")
+    return KERNEL_MATRICES[kernel_path]
+
+
+def release_kernel_matrices(folder: str):
+    # closes the memory maps of the kernel matrices in folder, otherwise the deleted files stay mapped
+    for kernel_path in [path for path in KERNEL_MATRICES if path.startswith(f"{folder}/")]:
+        del KERNEL_MATRICES[kernel_path]
+
+
+class PrecomputedKernelSVC(BaseEstimator, ClassifierMixin):
+    # SVC on kernel matrices that were calculated once for all samples (see go_prediction.save_rbf_kernel_matrices).
+    # X is a single column with the row indices of the samples in the kernel matrices, which allows
+    # GridSearchCV and cross validation to split it like a feature matrix.
+    # kernel_paths maps each value of gamma in the parameter grid to the .npy file with its kernel matrix.
+    def __init__(
+        self,
+        kernel_paths: dict = None,
+        gamma: str = "scale",
+        C: float = 1.0,
+        class_weight: str = "balanced",
+    ):
+        self.kernel_paths = kernel_paths
+        self.gamma = gamma
+        self.C = C
+        self.class_weight = class_weight
+
+    def __get_kernel(self, X):
+        sample_indices = np.asarray(X, dtype=np.int64).ravel()
+        kernel_matrix = load_kernel_matrix(self.kernel_paths[self.gamma])
+        return kernel_matrix[sample_indices][:, self.train_indices_]
+
+    def fit(self, X, y):
+        self.train_indices_ = np.asarray(X, dtype=np.int64).ravel()
+        self.svc_ = SVC(
+            kernel="precomputed", C=self.C, class_weight=self.class_weight
+        ).fit(self.__get_kernel(X), y)
+        self.classes_ = self.svc_.classes_
+        return self
+
+    def predict(self, X):
+        return self.svc_.predict(self.__get_kernel(X))
+
+    def decision_function(self, X):
+        return self.svc_.decision_function(self.__get_kernel(X))
+
+
 # class PSSMSelector(BaseEstimator, TransformerMixin):
 #     def __init__(self, feature_names, uniref_threshold="all", iterations="all"):
 #         self.feature_names = feature_names
@@ -1,33 +1,240 @@
-def read_fasta(fasta_file_name):
-    fasta_data = []
-    current_sequence = ""
-    last_header = ""
+import gzip
+import lzma
+import mmap
+import os
+import pandas as pd
+
+GZIP_MAGIC_BYTES = b"\x1f\x8b"
+XZ_MAGIC_BYTES = b"\xfd7zXZ\x00"
+WRITE_BUFFER_SIZE = 1 << 22  # 4MB
+
+
+def __open_fasta(fasta_file_name, mode: str = "r"):
+    # compression is detected from the file content when reading, and from the extension when writing
+    if mode == "r":
+        with open(fasta_file_name, "rb") as fasta_file:
+            magic_bytes = fasta_file.read(len(XZ_MAGIC_BYTES))
+        if magic_bytes.startswith(GZIP_MAGIC_BYTES):
+            return gzip.open(fasta_file_name, "rt")
+        if magic_bytes.startswith(XZ_MAGIC_BYTES):
+            return lzma.open(fasta_file_name, "rt")
+        return open(fasta_file_name)
+    if str(fasta_file_name).endswith(".gz"):
+        return gzip.open(fasta_file_name, "wt", compresslevel=6)
+    if str(fasta_file_name).endswith(".xz"):
+        return lzma.open(fasta_file_name, "wt")
+    return open(fasta_file_name, "w", buffering=WRITE_BUFFER_SIZE)
+
 
-    with open(fasta_file_name) as fasta_file:
+def iter_fasta(fasta_file_name, content: str = "sequence"):
+    """Reads a fasta file one record at a time. Plain, gzip and xz files are supported.
+
+    Args:
+        fasta_file_name: path to the fasta file
+        content (str, optional):
+            "sequence": yields tuples (header, sequence)
+            "header": yields headers only, without building the sequences
+            "length": yields tuples (header, sequence length)
+            Defaults to "sequence".
+
+    Yields:
+        Records from the fasta file. Headers include the ">" character.
+        As in read_fasta, records with empty sequences are skipped.
+    """
+    assert content in {"sequence", "header", "length"}, content
+    header = ""
+    sequence_chunks = list()
+    sequence_length = 0
+    with __open_fasta(fasta_file_name) as fasta_file:
         for line in fasta_file:
-            line = line.strip()
             if line.startswith(">"):
-                if current_sequence == "":
-                    last_header = line
-                    continue
-                else:
-                    fasta_data.append((last_header, current_sequence))
-                    current_sequence = ""
-                    # last_header = ""
-                    last_header = line
+                if sequence_length:
+                    match content:
+                        case "sequence":
+                            yield header, "".join(sequence_chunks)
+                        case "header":
+                            yield header
+                        case "length":
+                            yield header, sequence_length
+                    sequence_chunks = list()
+                    sequence_length = 0
+                header = line.strip()
+                continue
+            line = line.strip()
+            if content == "sequence":
+                sequence_chunks.append(line)
+            sequence_length += len(line)
+        if sequence_length:
+            match content:
+                case "sequence":
+                    yield header, "".join(sequence_chunks)
+                case "header":
+                    yield header
+                case "length":
+                    yield header, sequence_length
+
+
+def read_fasta(fasta_file_name):
+    return list(iter_fasta(fasta_file_name))
+
+
+def write_fasta(fasta_file_name, fasta_data, line_length: int = 60):
+    # fasta_data can be any iterable of (header, sequence), e.g. the generator from iter_fasta.
+    # Records are collected into blocks of at least WRITE_BUFFER_SIZE characters before writing.
+    with __open_fasta(fasta_file_name, "w") as outfile:
+        block = list()
+        block_size = 0
+        for header, sequence in fasta_data:
+            block.append(header)
+            block.extend(
+                sequence[i : i + line_length]
+                for i in range(0, len(sequence), line_length)
+            )
+            block_size += len(header) + len(sequence)
+            if block_size >= WRITE_BUFFER_SIZE:
+                block.append("")
+                outfile.write("\n".join(block))
+                block = list()
+                block_size = 0
+        if block:
+            block.append("")
+            outfile.write("\n".join(block))
+
+
+FAI_COLUMNS = ["length", "offset", "line_bases", "line_width"]
+
+
+def build_fasta_index(fasta_file_name, index_file_name=None) -> pd.DataFrame:
+    """Creates a samtools-compatible .fai index for an uncompressed fasta file.
+
+    Args:
+        fasta_file_name: path to the fasta file
+        index_file_name (optional): Defaults to None, which means fasta_file_name + ".fai"
+
+    Returns:
+        pd.DataFrame: One row per record, indexed by the first word of the header
+    """
+    if not index_file_name:
+        index_file_name = f"{fasta_file_name}.fai"
+    records = list()
+    name = None
+    with open(fasta_file_name, "rb") as fasta_file:
+        position = 0
+        for line in fasta_file:
+            line_width = len(line)
+            if line.startswith(b">"):
+                if name is not None:
+                    records.append(
+                        [name, length, offset, line_bases_first, line_width_first]
+                    )
+                name = line[1:].split(None, 1)[0].decode()
+                offset = position + line_width
+                length = 0
+                line_bases_first = line_width_first = 0
+                last_line_short = False
             else:
-                current_sequence += line
-        if current_sequence != "":
-            fasta_data.append((last_header, current_sequence))
-            # current_sequence = ""
-            # last_header = ""
-    return fasta_data
-
-
-def write_fasta(fasta_file_name, fasta_data):
-    with open(fasta_file_name, "w") as outfile:
-        for fasta_entry in fasta_data:
-            outfile.write(fasta_entry[0] + "\n")
-            sequence = fasta_entry[1]
-            for i in range(0, len(sequence), 60):
-                outfile.write(sequence[i : min(i + 60, len(sequence))] + "\n")
+                line_bases = len(line.rstrip(b"\r\n"))
+                if line_bases:
+                    # only the last line of a record can be shorter than the others
+                    assert not last_line_short and (
+                        line_bases_first == 0 or line_bases <= line_bases_first
+                    ), f"Inconsistent line lengths in record {name}"
+                    if line_bases_first == 0:
+                        line_bases_first, line_width_first = line_bases, line_width
+                    last_line_short = line_bases < line_bases_first
+                    length += line_bases
+            position += line_width
+        if name is not None:
+            records.append([name, length, offset, line_bases_first, line_width_first])
+    df_index = pd.DataFrame.from_records(records, columns=["name"] + FAI_COLUMNS)
+    df_index.to_csv(index_file_name, sep="\t", header=False, index=False)
+    return df_index.set_index("name")
+
+
+def read_fasta_index(fasta_file_name, index_file_name=None) -> pd.DataFrame:
+    if not index_file_name:
+        index_file_name = f"{fasta_file_name}.fai"
+    if not os.path.isfile(index_file_name):
+        return build_fasta_index(fasta_file_name, index_file_name)
+    return pd.read_csv(
+        index_file_name,
+        sep="\t",
+        header=None,
+        names=["name"] + FAI_COLUMNS,
+        usecols=range(5),
+        index_col="name",
+        # sequence names are arbitrary strings, e.g. "NA" or "007"
+        dtype={"name": str},
+        keep_default_na=False,
+        na_filter=False,
+    )
+
+
+class IndexedFasta:
+    """Random access to the sequences of a large uncompressed fasta file (e.g. UniRef),
+    through a .fai index and a memory map. The index is created on first use.
+
+    Example:
+        uniref50 = IndexedFasta("../data/raw/uniref/uniref50/uniref50.fasta")
+        uniref50.fetch("UniRef50_P12345")
+        uniref50.fetch("UniRef50_P12345", start=10, end=50)
+        uniref50.fetch_batch(list_of_names)
+    """
+
+    def __init__(self, fasta_file_name, index_file_name=None):
+        with open(fasta_file_name, "rb") as fasta_file:
+            assert not fasta_file.read(len(XZ_MAGIC_BYTES)).startswith(
+                (GZIP_MAGIC_BYTES, XZ_MAGIC_BYTES)
+            ), "Compressed fasta files do not support random access"
+        self.fasta_file_name = fasta_file_name
+        self.df_index = read_fasta_index(fasta_file_name, index_file_name)
+        self.__file = open(fasta_file_name, "rb")
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self.__mmap.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.df_index)
+
+    def __contains__(self, name):
+        return name in self.df_index.index
+
+    def __getitem__(self, name):
+        return self.fetch(name)
+
+    def __fetch(self, length, offset, line_bases, line_width, start, end):
+        # start and end are 0-based, end is exclusive, like a python slice
+        start = 0 if start is None else max(start, 0)
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return ""
+        file_start = offset + (start // line_bases) * line_width + start % line_bases
+        file_end = offset + (end // line_bases) * line_width + end % line_bases
+        return self.__mmap[file_start:file_end].translate(None, b"\r\n").decode()
+
+    def fetch(self, name: str, start: int = None, end: int = None) -> str:
+        length, offset, line_bases, line_width = self.df_index.loc[name, FAI_COLUMNS]
+        return self.__fetch(length, offset, line_bases, line_width, start, end)
+
+    def fetch_batch(self, names: list) -> pd.Series:
+        """Fetches many sequences at once, reading them in the order of their position in the file.
+
+        Returns:
+            pd.Series: sequences, in the order of names
+        """
+        df_index_batch = self.df_index.loc[list(names)].sort_values("offset")
+        sequences = {
+            name: self.__fetch(length, offset, line_bases, line_width, None, None)
+            for name, length, offset, line_bases, line_width in df_index_batch[
+                FAI_COLUMNS
+            ].itertuples()
+        }
+        return pd.Series(sequences, name="sequence").loc[list(names)]
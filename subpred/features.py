@@ -3,6 +3,10 @@ from subpred.pssm import calculate_pssm_feature
 import pandas as pd
 from sklearn.preprocessing import scale
 
+# feature types returned by calculate_features, used for identifying cached ML results.
+# Has to be updated when changing the features.
+FEATURE_TYPES = ["AAC", "PAAC", "PSSM_50_1", "PSSM_50_3", "PSSM_90_1", "PSSM_90_3"]
+
 
 def calculate_features(series_sequences: pd.Series, standardize_samples: bool = False):
     df_aac = calculate_aac(series_sequences)
@@ -60,6 +60,54 @@ def get_go_subgraph(
     return graph_go_subgraph
 
 
+# levels from get_go_levels, by (ontology version, root node, relations, namespaces)
+GO_LEVELS_CACHE = dict()
+
+
+def get_go_levels(
+    graph_go,
+    root_node: str = "GO:0022857",
+    keys: set = {"is_a"},
+    namespaces: set = {"molecular_function"},
+) -> pd.DataFrame:
+    """Distance of each term in the subgraph below root_node to the root node, as the number of terms
+    on the shortest and on the longest path (the root node has level 1, as len(nx.shortest_path)).
+    Both are calculated in one pass over the terms, from the root node down.
+    Results are cached by the data-version in the header of the obo file, the root node, keys and namespaces.
+
+    Returns:
+        pd.DataFrame: index go_id, columns min_level and max_level
+    """
+    # graphs from obonet store the header of the obo file in graph_go.graph
+    version = graph_go.graph.get("data-version")
+    cache_key = (version, root_node, frozenset(keys), frozenset(namespaces))
+    if version and cache_key in GO_LEVELS_CACHE:
+        # copies, changes of the callers must not reach the cache
+        return GO_LEVELS_CACHE[cache_key].copy()
+    graph_go_subgraph = get_go_subgraph(
+        graph_go=graph_go, root_node=root_node, keys=keys, namespaces=namespaces
+    )
+    # edges point from child to parent: parents come after their children in the topological order
+    min_levels = {root_node: 1}
+    max_levels = {root_node: 1}
+    for go_id in reversed(list(nx.topological_sort(graph_go_subgraph))):
+        parent_levels = [
+            (min_levels[parent], max_levels[parent])
+            for parent in graph_go_subgraph.successors(go_id)
+            if parent in min_levels
+        ]
+        if go_id == root_node or not parent_levels:
+            continue
+        min_levels[go_id] = min(level for level, _ in parent_levels) + 1
+        max_levels[go_id] = max(level for _, level in parent_levels) + 1
+    df_levels = pd.DataFrame(
+        {"min_level": min_levels, "max_level": max_levels}
+    ).rename_axis("go_id")
+    if version:
+        GO_LEVELS_CACHE[cache_key] = df_levels.copy()
+    return df_levels
+
+
 def __get_id_update_dict(graph_go):
     go_id_update_dict = dict()
     for go_term, alt_ids in graph_go.nodes(data="alt_id"):
@@ -80,8 +128,9 @@ def __get_go_annotations(
     qualifiers_keep: set = None,
     aspects_keep: set = None,
     evidence_codes_remove: set = None,
+    datasets_path: str = "../data/datasets",
 ):
-    df_uniprot_goa = load_df("go")
+    df_uniprot_goa = load_df("go", folder_path=datasets_path)
 
     # update go identifiers in annotation dataset to match go graph
     df_uniprot_goa["go_id"] = df_uniprot_goa.go_id.map(go_id_update_dict)
@@ -207,6 +256,7 @@ def get_go_annotations_subset(
         qualifiers_keep=go_protein_qualifiers_filter_set,
         aspects_keep={namespace_to_aspect[namespace] for namespace in namespaces_keep},
         evidence_codes_remove=annotations_evidence_codes_remove,
+        datasets_path=datasets_path,
     )
     # add ancestors
     df_uniprot_goa = __add_ancestors(
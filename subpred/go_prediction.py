@@ -1,4 +1,16 @@
 from random import choice, seed
+import itertools
+import fcntl
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import tempfile
+import time
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -8,54 +20,61 @@ from sklearn.preprocessing import MultiLabelBinarizer, LabelEncoder
 from sklearn.model_selection import (
     StratifiedKFold,
     GridSearchCV,
+    ParameterGrid,
 )
+from sklearn.base import clone
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import make_pipeline
+from sklearn.pipeline import make_pipeline, Pipeline
 from sklearn.metrics import f1_score
-from subpred.features import calculate_features
+from subpred.features import calculate_features, FEATURE_TYPES
+from subpred.custom_transformers import (
+    PrecomputedKernelSVC,
+    PrecomputedScores,
+    release_kernel_matrices,
+)
+from subpred.go_protein_index import GoProteinIndex
 from sklearn.metrics import make_scorer
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, cpu_count, parallel_backend
+from subpred.util import get_tmp_folder
 
 
 def get_label_to_proteins(
-    df_uniprot_goa, min_samples_per_class: int, exclude_iea: bool
+    df_uniprot_goa,
+    min_samples_per_class: int,
+    exclude_iea: bool,
+    go_protein_index: GoProteinIndex = None,
 ):
-    df_uniprot_goa_view = df_uniprot_goa.copy()
-    if exclude_iea:  # TODO maybe just do this at the beginning?
-        df_uniprot_goa_view = df_uniprot_goa_view[
-            df_uniprot_goa_view.evidence_code != "IEA"
-        ]
-
-    df_uniprot_labels = (
-        df_uniprot_goa_view[["Uniprot", "go_id_ancestor"]]
-        .drop_duplicates()
-        .reset_index(drop=True)
-        .rename(columns={"go_id_ancestor": "go_id"})
-    )
-    label_protein_counts = df_uniprot_labels.groupby("go_id").apply(len)
-    labels_enough_proteins = set(
-        label_protein_counts[
-            label_protein_counts >= min_samples_per_class
-        ].index.unique()
-    )
-
-    df_uniprot_labels = df_uniprot_labels[
-        df_uniprot_labels.go_id.isin(labels_enough_proteins)
-    ]
-    dict_label_to_proteins = (
-        df_uniprot_labels.drop_duplicates()
-        .reset_index(drop=True)
-        .groupby("go_id")
-        .apply(lambda x: set(x.Uniprot))
-        .to_dict()
+    # go_protein_index: index that was built from df_uniprot_goa with the same value of exclude_iea,
+    # to avoid building it again. df_uniprot_goa is not used in that case.
+    if go_protein_index is None:
+        go_protein_index = GoProteinIndex.from_annotations(
+            df_uniprot_goa, exclude_iea=exclude_iea
+        )
+    dict_label_to_proteins = go_protein_index.to_dict(
+        min_proteins=min_samples_per_class
     )
     return dict_label_to_proteins
 
 
+def __encode_labels(df_two_labels: pd.DataFrame, multilabel: bool):
+    if multilabel:
+        series_labels = df_two_labels.groupby("Uniprot").apply(lambda x: list(x.label))
+    else:
+        # series does not contain duplicated proteins, otherwise verify_integrity throws exception
+        series_labels = df_two_labels.set_index("Uniprot", verify_integrity=True)
+    sample_names = series_labels.index.values
+    # automatically uses sorted set of labels as reference
+    label_encoder = MultiLabelBinarizer() if multilabel else LabelEncoder()
+    y = label_encoder.fit_transform(series_labels.values.ravel())
+    class_names = label_encoder.classes_
+    assert len(class_names) == 2, class_names
+    return y, class_names, sample_names
+
+
 def transform_labels(
     df_features: pd.DataFrame, df_two_labels: pd.DataFrame, multilabel: bool = True
 ):
@@ -71,60 +90,122 @@ def transform_labels(
     Returns:
         Numpy arrays for sklearn
     """
-    if multilabel:
-        series_labels = df_two_labels.groupby("Uniprot").apply(lambda x: list(x.label))
-    else:
-        # series does not contain duplicated proteins, otherwise verify_integrity throws exception
-        series_labels = df_two_labels.set_index("Uniprot", verify_integrity=True)
-    sample_names = series_labels.index.values
+    y, class_names, sample_names = __encode_labels(df_two_labels, multilabel)
     X = df_features.loc[sample_names].values
-    # automatically uses sorted set of labels as reference
-    label_encoder = MultiLabelBinarizer() if multilabel else LabelEncoder()
-    y = label_encoder.fit_transform(series_labels.values.ravel())
-    class_names = label_encoder.classes_
-    assert len(class_names) == 2, class_names
     return X, y, class_names, sample_names
 
 
+def get_label_membership_matrix(dict_label_to_proteins: dict):
+    """Boolean matrix of shape (labels, proteins), where entry (i,j) is True
+    if protein j is annotated with label i. Labels and proteins are sorted.
+    """
+    classes = np.array(sorted(dict_label_to_proteins.keys()), dtype=object)
+    proteins = np.array(
+        sorted(set().union(*dict_label_to_proteins.values())), dtype=object
+    )
+    protein_to_position = {protein: pos for pos, protein in enumerate(proteins)}
+    membership = np.zeros((len(classes), len(proteins)), dtype=bool)
+    for i, go_id in enumerate(classes):
+        membership[
+            i, [protein_to_position[protein] for protein in dict_label_to_proteins[go_id]]
+        ] = True
+    return classes, proteins, membership
+
+
+def get_valid_label_pairs(membership: np.array, min_unique_samples_per_class: int):
+    """Indices (i,j) with i<j of all label pairs where both labels have at least
+    min_unique_samples_per_class proteins that are not annotated with the other label.
+    """
+    # float32 matrix product uses BLAS, and is exact for counts below 2**24
+    membership_float = membership.astype(np.float32)
+    intersection_counts = (membership_float @ membership_float.T).astype(np.int64)
+    label_counts = np.diag(intersection_counts)
+    unique_counts = label_counts[:, None] - intersection_counts  # unique to row label
+    is_valid = (unique_counts >= min_unique_samples_per_class) & (
+        unique_counts.T >= min_unique_samples_per_class
+    )
+    rows, columns = np.nonzero(np.triu(is_valid, k=1))
+    return list(zip(rows, columns))
+
+
+def get_equivalent_label_groups(
+    dict_label_to_proteins: dict, max_jaccard_distance: float = 0.0
+) -> dict:
+    """Groups labels with identical or near-identical protein sets, e.g. parent and child GO terms
+    that are annotated to the same proteins after adding the ancestors.
+
+    Labels are processed by descending number of proteins (then by name). Each label joins the group of the
+    first representative within max_jaccard_distance of its protein set, or becomes a new representative.
+
+    Args:
+        dict_label_to_proteins (dict): label -> set of proteins, as returned by get_label_to_proteins
+        max_jaccard_distance (float, optional): Maximum Jaccard distance between the protein sets of a label
+            and its representative. Defaults to 0.0, which only groups identical protein sets.
+
+    Returns:
+        dict: representative label -> list of labels in its group, including the representative
+    """
+    classes, _, membership = get_label_membership_matrix(dict_label_to_proteins)
+    membership_float = membership.astype(np.float32)
+    intersection_counts = (membership_float @ membership_float.T).astype(np.int64)
+    label_counts = np.diag(intersection_counts)
+    union_counts = label_counts[:, None] + label_counts[None, :] - intersection_counts
+    jaccard_distances = 1 - intersection_counts / np.maximum(union_counts, 1)
+    # classes are sorted, stable sort keeps the names in order for the same count
+    order = np.argsort(-label_counts, kind="stable")
+    representatives = list()
+    groups = dict()
+    for i in order:
+        matches = np.flatnonzero(
+            jaccard_distances[i, representatives] <= max_jaccard_distance
+        )
+        if len(matches) == 0:
+            representatives.append(i)
+            groups[i] = [i]
+        else:
+            groups[representatives[matches[0]]].append(i)
+    return {
+        classes[representative]: [classes[member] for member in members]
+        for representative, members in groups.items()
+    }
+
+
 def get_classification_tasks(
     df_features: pd.DataFrame,
     dict_label_to_proteins: dict,
     multi_output: bool,
     # min_samples_per_class: int=20,
     min_unique_samples_per_class: int = 15,
+    return_sample_indices: bool = False,
 ):
-    classes = sorted(list(dict_label_to_proteins.keys()))
-
-    for i, go_id1 in enumerate(classes):
-        set_proteins1 = dict_label_to_proteins[go_id1]
-        df_labels1 = pd.DataFrame({"Uniprot": list(set_proteins1), "label": go_id1})
-        for j in range(i, len(classes)):
-            go_id2 = classes[j]
-            if go_id1 == go_id2:
-                continue
-            set_proteins2 = dict_label_to_proteins[go_id2]
-            df_labels2 = pd.DataFrame({"Uniprot": list(set_proteins2), "label": go_id2})
-            df_labels = (
-                pd.concat([df_labels1, df_labels2])
-                .drop_duplicates()
-                .sort_values(["Uniprot", "label"])
-                .reset_index(drop=True)
-            )
-            # TODO if enough samples are available, it could also be viable to turn antiport/symport into a separate class
-            intersection_set = set_proteins1 & set_proteins2
-            unique_proteins1 = set_proteins1 - intersection_set
-            unique_proteins2 = set_proteins2 - intersection_set
-            if (
-                len(unique_proteins1) < min_unique_samples_per_class
-                or len(unique_proteins2) < min_unique_samples_per_class
-            ):
-                # filter out cases where all proteins from one class are also in the other class (e.g. only (1,1) and (1,0))
-                continue
-            if not multi_output:
-                df_labels = df_labels[
-                    df_labels.Uniprot.isin(unique_proteins1 | unique_proteins2)
-                ]
-            yield transform_labels(df_features, df_labels, multilabel=multi_output)
+    # return_sample_indices: yield the row positions of the samples in df_features instead of X,
+    # for workers that read the features from shared memory
+    classes, proteins, membership = get_label_membership_matrix(dict_label_to_proteins)
+    # filter out cases where all proteins from one class are also in the other class (e.g. only (1,1) and (1,0))
+    label_pairs = get_valid_label_pairs(membership, min_unique_samples_per_class)
+    feature_rows = df_features.index.get_indexer(proteins)
+    assert (feature_rows >= 0).all(), "proteins without features in df_features"
+
+    for i, j in label_pairs:
+        # TODO if enough samples are available, it could also be viable to turn antiport/symport into a separate class
+        if multi_output:
+            # one-hot encoding of both labels, proteins can have both
+            sample_mask = membership[i] | membership[j]
+            y = np.column_stack(
+                [membership[i, sample_mask], membership[j, sample_mask]]
+            ).astype(np.int64)
+        else:
+            # proteins annotated with only one of the labels, encoded as 0 or 1
+            sample_mask = membership[i] ^ membership[j]
+            y = membership[j, sample_mask].astype(np.int64)
+        # labels and proteins are sorted, same order as MultiLabelBinarizer and LabelEncoder
+        class_names = classes[[i, j]]
+        sample_names = proteins[sample_mask]
+        sample_indices = feature_rows[sample_mask]
+        if return_sample_indices:
+            yield sample_indices, y, class_names, sample_names
+        else:
+            yield df_features.values[sample_indices], y, class_names, sample_names
 
 
 def stratify_multioutput(element):
@@ -146,47 +227,87 @@ def get_stratification_array(arr):
 
 
 
-def get_model_scores(
-    X,
-    y,
-    model_name: str = "svc_multi",
-    feature_selection_parameters: list = None,
-    multi_output: bool = True,
-    n_threads: int = -1,
-    class_names: np.array = np.array([]),
-    sample_names: np.array = np.array([]),
+def __get_fold_candidate_scores(
+    estimator: Pipeline, candidates: list, X, y, train_index, test_index
+) -> np.array:
+    # scores of all candidates on one fold, see get_fold_cached_grid_search_scores
+    scaler = estimator.steps[0][1]
+    inner_estimator = estimator.named_steps["multioutputclassifier"].estimator
+    selector_name = None
+    if isinstance(inner_estimator, Pipeline) and isinstance(
+        inner_estimator.steps[0][1], (SelectPercentile, SelectKBest)
+    ):
+        selector_name, selector = inner_estimator.steps[0]
+    prefix = "multioutputclassifier__estimator__"
+    fold_scores = np.zeros((len(candidates), 3))
+    fold_scaler = clone(scaler).fit(X[train_index])
+    X_train = fold_scaler.transform(X[train_index])
+    X_test = fold_scaler.transform(X[test_index])
+    y_train, y_test = y[train_index], y[test_index]
+    feature_scores = [
+        selector.score_func(X_train, y_train[:, label]) if selector_name else None
+        for label in range(y.shape[1])
+    ]
+    for candidate, params in enumerate(candidates):
+        inner_params = {
+            param[len(prefix) :]: value for param, value in params.items()
+        }
+        y_pred = list()
+        for label in range(y.shape[1]):
+            label_estimator = clone(inner_estimator).set_params(**inner_params)
+            if selector_name:
+                label_estimator.set_params(
+                    **{
+                        f"{selector_name}__score_func": PrecomputedScores(
+                            *feature_scores[label]
+                        )
+                    }
+                )
+            label_estimator.fit(X_train, y_train[:, label])
+            y_pred.append(label_estimator.predict(X_test))
+        # same as MultiOutputClassifier.predict
+        y_pred = np.asarray(y_pred).T
+        fold_scores[candidate] = [
+            f1_score(y_test, y_pred, average="macro", zero_division=0),
+            f1_score(y_test, y_pred, labels=[0], average="macro", zero_division=0),
+            f1_score(y_test, y_pred, labels=[1], average="macro", zero_division=0),
+        ]
+    return fold_scores
+
+
+def get_fold_cached_grid_search_scores(
+    estimator: Pipeline, param_grid: dict, X, y, cv_splits: list, n_jobs: int = 1
 ):
-    models = {
-        "svc": make_pipeline(
-            StandardScaler(),
-            SVC(class_weight="balanced"),
-        ),
-        "svc_multi": make_pipeline(
-            StandardScaler(),
-            MultiOutputClassifier(SVC(class_weight="balanced")),
-        ),
-        "pca_svc_multi": make_pipeline(
-            StandardScaler(),
-            PCA(),
-            MultiOutputClassifier(SVC(class_weight="balanced")),
-        ),
-        "pbest_svc_multi": make_pipeline(
-            StandardScaler(),
-            MultiOutputClassifier(
-                make_pipeline(SelectPercentile(), SVC(class_weight="balanced"))
-            ),
-        ),
-        "kbest_svc_multi": make_pipeline(
-            StandardScaler(),
-            MultiOutputClassifier(
-                make_pipeline(SelectKBest(), SVC(class_weight="balanced"))
-            ),
-        ),
-        "rf": make_pipeline(
-            StandardScaler(),
-            RandomForestClassifier(), 
+    """Grid search for pipelines of the form StandardScaler -> MultiOutputClassifier(SVC),
+    optionally with a SelectPercentile or SelectKBest step before the SVC.
+    Replaces GridSearchCV, where every parameter combination refits the StandardScaler and
+    recalculates the feature scores of the selector on the same folds.
+    Here, the scaled fold matrices and the feature scores for each label are calculated once per fold,
+    and reused for all parameter combinations. The results are the same as with GridSearchCV.
+    With n_jobs, the folds are processed in parallel.
+
+    Returns:
+        dict: best parameters
+        np.array: mean validation scores of the best parameters: f1 macro, f1 label 0, f1 label 1
+    """
+    candidates = list(ParameterGrid(param_grid))
+    candidate_scores = np.stack(
+        Parallel(n_jobs=n_jobs)(
+            delayed(__get_fold_candidate_scores)(
+                estimator, candidates, X, y, train_index, test_index
+            )
+            for train_index, test_index in cv_splits
         ),
-    }
+        axis=1,
+    )
+    mean_scores = candidate_scores.mean(axis=1)
+    # first candidate with the highest score, same as rank_test_f1_macro in GridSearchCV
+    best_index = np.argmax(mean_scores[:, 0])
+    return candidates[best_index], mean_scores[best_index]
+
+
+def get_param_grid(model_name: str, feature_selection_parameters: list = None) -> dict:
+    """Hyperparameters of the grid search in get_model_scores"""
     param_grids = {
         "svc_multi": {
             "multioutputclassifier__estimator__C": [0.1, 1, 10],
@@ -228,7 +349,94 @@ def get_model_scores(
             "svc__gamma": ["scale", "auto"],
         },
         "rf": {},
+        "svc_precomputed": {
+            "precomputedkernelsvc__C": [0.1, 1, 10],
+            "precomputedkernelsvc__gamma": ["scale", "auto"],
+        },
+        "svc_multi_precomputed": {
+            "multioutputclassifier__estimator__C": [0.1, 1, 10],
+            "multioutputclassifier__estimator__gamma": ["scale", "auto"],
+        },
     }
+    return param_grids[model_name]
+
+
+def get_param_grid_size(param_grid: dict) -> int:
+    # single values instead of lists count as one candidate
+    return int(
+        np.prod(
+            [
+                len(values) if isinstance(values, (list, np.ndarray)) else 1
+                for values in param_grid.values()
+            ]
+        )
+    )
+
+
+def get_model_scores(
+    X,
+    y,
+    model_name: str = "svc_multi",
+    feature_selection_parameters: list = None,
+    multi_output: bool = True,
+    n_threads: int = -1,
+    class_names: np.array = np.array([]),
+    sample_names: np.array = np.array([]),
+    kernel_paths: dict = None,
+    cache_fold_transforms: bool = False,
+    fold_log: list = None,
+):
+    # fold_log: if a list is given, the runtime and best parameters of each outer fold are appended to it
+    # cache_fold_transforms: use get_fold_cached_grid_search_scores instead of GridSearchCV,
+    # only for the multi-output SVC models without PCA. Results are identical.
+    # kernel_paths: only for the models "svc_precomputed" and "svc_multi_precomputed",
+    # where X contains row indices into the kernel matrices from save_rbf_kernel_matrices
+    models = {
+        "svc": make_pipeline(
+            StandardScaler(),
+            SVC(class_weight="balanced"),
+        ),
+        "svc_multi": make_pipeline(
+            StandardScaler(),
+            MultiOutputClassifier(SVC(class_weight="balanced")),
+        ),
+        "pca_svc_multi": make_pipeline(
+            StandardScaler(),
+            PCA(),
+            MultiOutputClassifier(SVC(class_weight="balanced")),
+        ),
+        "pbest_svc_multi": make_pipeline(
+            StandardScaler(),
+            MultiOutputClassifier(
+                make_pipeline(SelectPercentile(), SVC(class_weight="balanced"))
+            ),
+        ),
+        "kbest_svc_multi": make_pipeline(
+            StandardScaler(),
+            MultiOutputClassifier(
+                make_pipeline(SelectKBest(), SVC(class_weight="balanced"))
+            ),
+        ),
+        "rf": make_pipeline(
+            StandardScaler(),
+            RandomForestClassifier(), 
+        ),
+        "svc_precomputed": make_pipeline(
+            PrecomputedKernelSVC(kernel_paths=kernel_paths, class_weight="balanced"),
+        ),
+        "svc_multi_precomputed": make_pipeline(
+            MultiOutputClassifier(
+                PrecomputedKernelSVC(kernel_paths=kernel_paths, class_weight="balanced")
+            ),
+        ),
+    }
+    param_grid = get_param_grid(model_name, feature_selection_parameters)
+    if cache_fold_transforms:
+        assert multi_output and model_name in {
+            "svc_multi",
+            "pbest_svc_multi",
+            "kbest_svc_multi",
+        }, model_name
     train_scores_label0 = list()
     train_scores_label1 = list()
     test_scores_label0 = list()
@@ -237,6 +445,7 @@ def get_model_scores(
     # randonly assigns proteins in category "both" to one of them, deterministically
     y_stratify = get_stratification_array(y) if multi_output else y
     for train_index, test_index in StratifiedKFold(n_splits=5).split(X, y_stratify):
+        fold_start_time, fold_start_cpu_time = time.perf_counter(), time.process_time()
         X_train, y_train = X[train_index], y[train_index]
         X_test, y_test = X[test_index], y[test_index]
 
@@ -249,9 +458,35 @@ def get_model_scores(
                 ).split(X_train, y_train_stratified)
             ]
 
+        if cache_fold_transforms:
+            best_params, best_scores = get_fold_cached_grid_search_scores(
+                estimator=models[model_name],
+                param_grid=param_grid,
+                X=X_train,
+                y=y_train,
+                cv_splits=grid_search_splits_multioutput_statified,
+                n_jobs=n_threads,
+            )
+            # the average of the two labels is the same as the macro-averaged f1 score
+            train_scores_label0.append(best_scores[1])
+            train_scores_label1.append(best_scores[2])
+            # refit on the entire training set, like GridSearchCV
+            best_model = clone(models[model_name]).set_params(**best_params)
+            best_model.fit(X_train, y_train)
+            test_scores = f1_score(
+                y_true=y_test,
+                y_pred=best_model.predict(X_test),
+                average=None,
+                labels=[0, 1],
+            )
+            test_scores_label0.append(test_scores[0])
+            test_scores_label1.append(test_scores[1])
+            __log_fold(fold_log, fold_start_time, fold_start_cpu_time, best_params)
+            continue
+
         gs = GridSearchCV(
             estimator=models[model_name],
-            param_grid=param_grids[model_name],
+            param_grid=param_grid,
             # optimize for average performance across both labels, punish models that only predict one label
             # get individual scores for each label as well.
             scoring={
@@ -280,6 +515,7 @@ def get_model_scores(
         )
         test_scores_label0.append(test_scores[0])
         test_scores_label1.append(test_scores[1])
+        __log_fold(fold_log, fold_start_time, fold_start_cpu_time, gs.best_params_)
 
     # return instead of yield to be compatible with joblib parallel
     return (
@@ -293,6 +529,90 @@ def get_model_scores(
     )
 
 
+def __log_fold(
+    fold_log: list, start_time: float, start_cpu_time: float, best_params: dict
+):
+    if fold_log is None:
+        return
+    fold_log.append(
+        dict(
+            wall_time=time.perf_counter() - start_time,
+            cpu_time=time.process_time() - start_cpu_time,
+            best_params=best_params,
+        )
+    )
+
+
+# memory mapped feature matrices in the worker processes, by file path
+SHARED_FEATURES = dict()
+
+
+def load_shared_features(features_path: str):
+    if features_path not in SHARED_FEATURES:
+        # opened once per worker process, pages are shared between all processes
+        SHARED_FEATURES[features_path] = np.load(features_path, mmap_mode="r")
+    return SHARED_FEATURES[features_path]
+
+
+def release_shared_features(folder: str):
+    # closes the memory maps of the files in folder, otherwise the deleted files stay mapped
+    for features_path in [path for path in SHARED_FEATURES if path.startswith(f"{folder}/")]:
+        del SHARED_FEATURES[features_path]
+
+
+@contextmanager
+def shared_memory_folder(required_bytes: int):
+    """Temporary folder for the memory mapped matrices of one evaluation, in memory if there is space.
+    The memory maps of the current process are closed before the folder is deleted."""
+    with tempfile.TemporaryDirectory(dir=get_tmp_folder(required_bytes)) as folder:
+        try:
+            yield folder
+        finally:
+            release_shared_features(folder)
+            release_kernel_matrices(folder)
+
+
+def get_model_scores_shared(features_path: str, sample_indices: np.array, y, **kwargs):
+    """Same as get_model_scores, but X is read from a feature matrix in shared memory.
+    Only the row indices and labels have to be sent to the worker process."""
+    if kwargs.get("kernel_paths"):
+        # the model reads the precomputed kernel matrices itself
+        return get_model_scores(sample_indices.reshape(-1, 1), y, **kwargs)
+    X = load_shared_features(features_path)[sample_indices]
+    return get_model_scores(X, y, **kwargs)
+
+
+def save_rbf_kernel_matrices(
+    X: np.array, folder: str, gammas: tuple = ("scale", "auto")
+) -> dict:
+    """Calculates the RBF kernel matrix between all samples once for each value of gamma,
+    and saves them as .npy files for memory mapping.
+
+    Approximation: In the normal pipelines, StandardScaler is fitted on the training samples of each fold.
+    Here, the features are standardized once across all samples, since the kernel matrix is shared by all
+    folds and GO pairs. gamma "scale" is calculated on the standardized matrix of all samples as well.
+    Use model "svc_multi" for the exact per-fold semantics.
+
+    Returns:
+        dict: gamma -> path of the kernel matrix
+    """
+    X = StandardScaler().fit_transform(X)
+    squared_norms = (X**2).sum(axis=1)
+    squared_distances = squared_norms[:, None] + squared_norms[None, :] - 2 * X @ X.T
+    np.maximum(squared_distances, 0, out=squared_distances)
+    gamma_values = {"scale": 1.0 / (X.shape[1] * X.var()), "auto": 1.0 / X.shape[1]}
+    kernel_paths = dict()
+    for gamma in gammas:
+        kernel_path = f"{folder}/kernel_gamma_{gamma}.npy"
+        # float32 halves the size in shared memory, SVC converts the slices of each fold to float64
+        np.save(
+            kernel_path,
+            np.exp(-gamma_values.get(gamma, gamma) * squared_distances).astype(np.float32),
+        )
+        kernel_paths[gamma] = kernel_path
+    return kernel_paths
+
+
 def get_model_evaluation_matrix_parallel(
     df_sequences: pd.DataFrame,
     df_uniprot_goa: pd.DataFrame,
@@ -305,7 +625,37 @@ def get_model_evaluation_matrix_parallel(
     feature_selection_parameters=None,
     n_jobs: int = -1,
     n_jobs_gridsearch: int = 1,
+    precomputed_kernels: bool = False,
+    cache_fold_transforms: bool = False,
+    checkpoint_file: str = None,
+    pair_store_folder: str = None,
+    label_groups: dict = None,
+    parallelize_largest_tasks: bool = True,
+    telemetry_file: str = None,
+    verbose: bool = False,
 ):
+    # telemetry_file: one json line per evaluated pair is appended to this file, see __evaluate_task.
+    # Summarize with get_telemetry_report.
+    # parallelize_largest_tasks: the pairs with the most samples are started first, each with several threads
+    # for the grid search instead of n_jobs_gridsearch, such that they do not finish long after the others.
+    # label_groups: from get_equivalent_label_groups. Only the representatives are evaluated,
+    # pass the same dict to process_pairwise_eval_results for the scores of the other labels.
+    # checkpoint_file: every result is appended to this file as soon as it is finished.
+    # When restarting after a crash with the same file, pairs that are already in the file are skipped.
+    # pair_store_folder: results of single pairs, shared between datasets and calls, one file per pair.
+    # A pair is only evaluated if no other call has evaluated the same proteins with the same
+    # model and features before (see get_pair_store_key), e.g. for a GO term pair that has the
+    # same annotations in two datasets.
+    # verbose: print progress and estimated remaining time
+    # cache_fold_transforms: see get_model_scores
+    # precomputed_kernels: for model_name "svc" or "svc_multi". Calculates the RBF kernel matrix
+    # for all proteins once, instead of for every pair, fold and parameter combination.
+    # Standardization is approximated, see save_rbf_kernel_matrices.
+    if precomputed_kernels:
+        assert model_name in {"svc", "svc_multi"}, model_name
+        # the gamma values of the kernel matrices depend on all proteins in the dataset
+        assert not pair_store_folder, "pair_store_folder is not supported with precomputed_kernels"
+        model_name = f"{model_name}_precomputed"
     df_features = calculate_features(
         df_sequences.sequence, standardize_samples=standardize_samples
     )
@@ -314,34 +664,602 @@ def get_model_evaluation_matrix_parallel(
         min_samples_per_class=min_samples_per_class,
         exclude_iea=exclude_iea,
     )
+    if label_groups:
+        n_pairs_all_labels = len(
+            get_valid_label_pairs(
+                get_label_membership_matrix(dict_label_to_proteins)[2],
+                min_unique_samples_per_class,
+            )
+        )
+        dict_label_to_proteins = {
+            label: dict_label_to_proteins[label] for label in label_groups
+        }
 
-    # if higher sample count or lower number of classes: paralellize svm or cv or gridsearch instead
-    results = Parallel(n_jobs=n_jobs, backend="multiprocessing")(
-        delayed(get_model_scores)(
-            X,
-            y,
-            model_name=model_name,
-            feature_selection_parameters=feature_selection_parameters,
-            multi_output=multi_output,
-            n_threads=n_jobs_gridsearch,
-            class_names=class_names,
-            sample_names=sample_names,
+    # The feature matrix is written once to a memory mapped file (in memory if /dev/shm has space).
+    # Each task only contains the row indices of its samples, instead of a copy of X.
+    n_samples, n_features = df_features.shape
+    required_bytes = 8 * n_samples * n_features
+    if precomputed_kernels:
+        # one float32 kernel matrix per value of gamma
+        required_bytes += 4 * n_samples * n_samples * 2
+    with shared_memory_folder(required_bytes) as features_folder:
+        features_path = f"{features_folder}/features.npy"
+        np.save(features_path, df_features.values.astype(np.float64))
+        kernel_paths = (
+            save_rbf_kernel_matrices(df_features.values, features_folder)
+            if precomputed_kernels
+            else None
         )
-        for X, y, class_names, sample_names in get_classification_tasks(
-            df_features=df_features,
-            dict_label_to_proteins=dict_label_to_proteins,
-            multi_output=multi_output,
-            min_unique_samples_per_class=min_unique_samples_per_class,
+
+        tasks = [
+            (
+                (features_path, sample_indices, y),
+                dict(
+                    model_name=model_name,
+                    feature_selection_parameters=feature_selection_parameters,
+                    multi_output=multi_output,
+                    n_threads=n_jobs_gridsearch,
+                    class_names=class_names,
+                    sample_names=sample_names,
+                    kernel_paths=kernel_paths,
+                    cache_fold_transforms=cache_fold_transforms,
+                ),
+            )
+            for sample_indices, y, class_names, sample_names in get_classification_tasks(
+                df_features=df_features,
+                dict_label_to_proteins=dict_label_to_proteins,
+                multi_output=multi_output,
+                min_unique_samples_per_class=min_unique_samples_per_class,
+                return_sample_indices=True,
+            )
+        ]
+        if label_groups and verbose:
+            print(
+                f"{len(dict_label_to_proteins)} representatives of equivalent labels: "
+                f"evaluating {len(tasks)} pairs, avoided {n_pairs_all_labels - len(tasks)} pairs"
+            )
+        pair_to_result = read_checkpoint(checkpoint_file)
+        pair_to_store_key = dict()
+        if pair_store_folder:
+            series_sequences = df_sequences.sequence.groupby(level=0).first()
+            model_parameters = dict(
+                model_name=model_name,
+                feature_selection_parameters=feature_selection_parameters,
+                multi_output=multi_output,
+                standardize_samples=standardize_samples,
+                feature_types=FEATURE_TYPES,
+            )
+            pair_to_store_key = {
+                tuple(kwargs["class_names"]): get_pair_store_key(
+                    *[
+                        series_sequences.loc[sorted(dict_label_to_proteins[label])]
+                        for label in kwargs["class_names"]
+                    ],
+                    model_parameters=model_parameters,
+                )
+                for _, kwargs in tasks
+            }
+            store_key_to_result = read_pair_store(
+                pair_store_folder,
+                [
+                    store_key
+                    for pair, store_key in pair_to_store_key.items()
+                    if pair not in pair_to_result
+                ],
+            )
+            for pair, store_key in pair_to_store_key.items():
+                if pair not in pair_to_result and store_key in store_key_to_result:
+                    # only the GO terms can differ, the proteins and labels are the same
+                    pair_to_result[pair] = (
+                        np.array(pair, dtype=object),
+                        *store_key_to_result[store_key][1:],
+                    )
+        tasks_todo = [
+            (args, kwargs)
+            for args, kwargs in tasks
+            if tuple(kwargs["class_names"]) not in pair_to_result
+        ]
+        # the checkpoint can also contain pairs that are not evaluated in this call
+        n_reused = len(tasks) - len(tasks_todo)
+        if verbose and n_reused:
+            print(f"reusing previous results for {n_reused} of {len(tasks)} pairs")
+        n_jobs = n_jobs if n_jobs > 0 else cpu_count() + n_jobs + 1
+        # The runtime of a task grows with the square of the number of samples (SVC) and with the grid size.
+        # Tasks are started largest first, such that no large task is left over at the end.
+        # imap_unordered hands out one task at a time to the next free worker.
+        n_candidates = get_param_grid_size(
+            get_param_grid(model_name, feature_selection_parameters)
+        )
+        tasks_todo = sorted(
+            tasks_todo,
+            key=lambda task: get_task_cost(len(task[0][1]), n_candidates),
+            reverse=True,
         )
+        task_costs = [get_task_cost(len(args[1]), n_candidates) for args, _ in tasks_todo]
+        # Tasks that are more expensive than the average work per worker would still finish last.
+        # Those get several threads for the grid search, as many as it can use: the 4 inner folds
+        # with cache_fold_transforms, otherwise every parameter combination of every inner fold.
+        # At most n_jobs // n_threads_large tasks, such that they do not need more than n_jobs cores together.
+        n_threads_large = min(n_jobs, 4 if cache_fold_transforms else 4 * n_candidates)
+        n_large_tasks = 0
+        if parallelize_largest_tasks and n_threads_large > 1:
+            while (
+                n_large_tasks < min(len(tasks_todo), n_jobs // n_threads_large)
+                and task_costs[n_large_tasks]
+                > sum(task_costs[n_large_tasks:]) / n_jobs
+            ):
+                n_large_tasks += 1
+        if verbose and n_large_tasks:
+            print(
+                f"evaluating the {n_large_tasks} largest pairs with {n_threads_large} threads each"
+            )
+        tasks_todo = [
+            (args, dict(kwargs, n_threads=n_threads_large))
+            for args, kwargs in tasks_todo[:n_large_tasks]
+        ] + tasks_todo[n_large_tasks:]
+        start_time = time.time()
+        with (
+            # no worker processes without tasks, e.g. when all results are reused
+            multiprocessing.Pool(processes=min(n_jobs, len(tasks_todo)))
+            if tasks_todo
+            else nullcontext() as pool,
+            open(checkpoint_file if checkpoint_file else os.devnull, "a+b") as checkpoint,
+            open(telemetry_file if telemetry_file else os.devnull, "a") as telemetry,
+        ):
+
+            def iter_results():
+                if not tasks_todo:
+                    return
+                # While the large tasks run, their threads and the other workers can use up to twice n_jobs cores
+                yield from pool.imap_unordered(__evaluate_task, tasks_todo)
+
+            pair_to_cost = {
+                tuple(kwargs["class_names"]): cost
+                for (_, kwargs), cost in zip(tasks_todo, task_costs)
+            }
+            cost_finished = 0
+            checkpoint_end = 0
+            # results are written as soon as they are finished, in any order
+            for n_finished, (result, event) in enumerate(iter_results(), start=1):
+                telemetry.write(json.dumps(event, default=str) + "\n")
+                telemetry.flush()
+                pair_to_result[tuple(result[0])] = result
+                if checkpoint_file:
+                    checkpoint_end = __append_record(checkpoint, result, checkpoint_end)
+                if pair_store_folder:
+                    __write_pair_store_entry(
+                        pair_store_folder, pair_to_store_key[tuple(result[0])], result
+                    )
+                cost_finished += pair_to_cost[tuple(result[0])]
+                if verbose:
+                    __print_progress(
+                        n_finished,
+                        len(tasks_todo),
+                        len(tasks),
+                        start_time,
+                        cost_finished / sum(task_costs),
+                    )
+    # same order as the tasks
+    return [pair_to_result[tuple(kwargs["class_names"])] for _, kwargs in tasks]
+
+
+def get_task_cost(n_samples: int, n_candidates: int) -> int:
+    # relative runtime estimate of one pair in get_model_evaluation_matrix_parallel
+    return n_samples**2 * n_candidates
+
+
+def __evaluate_task(task: tuple):
+    # returns the result of get_model_scores_shared, and a telemetry event
+    args, kwargs = task
+    fold_log = list()
+    start_time, start_cpu_time = time.time(), time.process_time()
+    # The workers of multiprocessing.Pool cannot start processes (joblib would fall back to n_jobs=1),
+    # the grid search runs in threads instead. libsvm releases the GIL while fitting.
+    with parallel_backend("threading"):
+        result = get_model_scores_shared(*args, fold_log=fold_log, **kwargs)
+    end_time = time.time()
+    event = dict(
+        pair=list(result[0]),
+        n_samples=len(args[1]),
+        n_features=load_shared_features(args[0]).shape[1],
+        n_threads=kwargs.get("n_threads"),
+        worker_pid=os.getpid(),
+        start_time=start_time,
+        end_time=end_time,
+        wall_time=end_time - start_time,
+        # only the worker process, without the processes of a parallel grid search
+        cpu_time=time.process_time() - start_cpu_time,
+        # maximum over the lifetime of the worker process, in MB (ru_maxrss is in KB on linux)
+        peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        folds=fold_log,
     )
+    return result, event
+
+
+def read_telemetry(telemetry_file: str) -> pd.DataFrame:
+    """Reads the events that get_model_evaluation_matrix_parallel wrote to telemetry_file
+
+    Returns:
+        pd.DataFrame: one row per evaluated pair
+    """
+    events = list()
+    with open(telemetry_file) as telemetry:
+        for line in telemetry:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # incomplete line after a crash
+                continue
+    return pd.DataFrame.from_records(events)
+
+
+def get_telemetry_report(telemetry_file: str):
+    """Summary of the task events from get_model_evaluation_matrix_parallel
+
+    Returns:
+        pd.Series: throughput, worker utilization, latency percentiles and memory usage
+        pd.DataFrame: number of outer folds in which each hyperparameter value was chosen
+        pd.DataFrame: the pairs with the longest runtime
+    """
+    df_tasks = read_telemetry(telemetry_file)
+    total_time = df_tasks.end_time.max() - df_tasks.start_time.min()
+    n_workers = df_tasks.worker_pid.nunique()
+    wall_times = df_tasks.wall_time
+    series_summary = pd.Series(
+        {
+            "n_tasks": len(df_tasks),
+            "n_workers": n_workers,
+            "total_time": total_time,
+            "tasks_per_hour": len(df_tasks) / total_time * 3600,
+            # fraction of the time in which the workers were evaluating tasks
+            "worker_utilization": wall_times.sum() / (total_time * n_workers),
+            "cpu_per_wall_time": df_tasks.cpu_time.sum() / wall_times.sum(),
+            "wall_time_mean": wall_times.mean(),
+            "wall_time_p50": wall_times.quantile(0.5),
+            "wall_time_p90": wall_times.quantile(0.9),
+            "wall_time_p99": wall_times.quantile(0.99),
+            "wall_time_max": wall_times.max(),
+            "fold_wall_time_mean": np.mean(
+                [fold["wall_time"] for folds in df_tasks.folds for fold in folds]
+            ),
+            "peak_rss_max": df_tasks.peak_rss.max(),
+        }
+    )
+    df_best_params = pd.DataFrame.from_records(
+        [
+            (parameter, str(value))
+            for folds in df_tasks.folds
+            for fold in folds
+            for parameter, value in fold["best_params"].items()
+        ],
+        columns=["parameter", "value"],
+    )
+    df_best_params = (
+        df_best_params.groupby(["parameter", "value"])
+        .size()
+        .rename("n_folds")
+        .reset_index()
+    )
+    df_slowest_tasks = df_tasks.sort_values("wall_time", ascending=False)[
+        ["pair", "n_samples", "n_features", "n_threads", "wall_time", "cpu_time"]
+    ].head(10)
+    return series_summary, df_best_params, df_slowest_tasks
+
+
+def __print_progress(
+    n_finished: int,
+    n_todo: int,
+    n_total: int,
+    start_time: float,
+    fraction_finished: float = None,
+):
+    # fraction_finished: estimated fraction of the total work, instead of n_finished/n_todo
+    elapsed = time.time() - start_time
+    if fraction_finished is None:
+        fraction_finished = n_finished / n_todo
+    remaining = elapsed / fraction_finished * (1 - fraction_finished)
+    n_done = n_total - n_todo + n_finished
+    print(
+        f"evaluated {n_done} of {n_total} pairs ({round(n_done / n_total * 100, 2)}%), "
+        f"elapsed: {timedelta(seconds=round(elapsed))}, remaining: ~{timedelta(seconds=round(remaining))}",
+        end="\n" if n_finished == n_todo else "\r",
+    )
+
+
+def __read_records(log, log_file: str) -> tuple:
+    # Complete records from the current position of log to the end of the file,
+    # and the position after the last complete record.
+    # A record that was not written completely (crash while writing) is reported and ignored.
+    records = list()
+    while True:
+        position = log.tell()
+        try:
+            records.append(pickle.load(log))
+        except (EOFError, pickle.UnpicklingError) as error:
+            if position < os.fstat(log.fileno()).st_size:
+                print(f"{log_file}: ignoring incomplete record at byte {position} ({error!r})")
+            break
+    return records, position
+
+
+def __read_results_log(log_file: str) -> list:
+    # reads all objects that were appended to log_file with __append_record, without modifying the file
+    if not log_file or not os.path.isfile(log_file):
+        return list()
+    with open(log_file, "rb") as log:
+        # shared lock: no other process is in the middle of appending a record
+        fcntl.flock(log, fcntl.LOCK_SH)
+        results, _ = __read_records(log, log_file)
     return results
 
 
+def __append_record(log, record, verified_end: int) -> int:
+    # Appends record to log (opened with "a+b") under an exclusive lock, returns the new verified end.
+    # Records that other processes appended after verified_end are checked first. An incomplete record
+    # at the end (crash while writing) is removed, such that it is not followed by complete records.
+    data = pickle.dumps(record)
+    fcntl.flock(log, fcntl.LOCK_EX)
+    try:
+        log.seek(verified_end)
+        _, end = __read_records(log, log.name)
+        log.truncate(end)
+        log.write(data)
+        log.flush()
+        return end + len(data)
+    finally:
+        fcntl.flock(log, fcntl.LOCK_UN)
+
+
+def read_checkpoint(checkpoint_file: str) -> dict:
+    """Reads the results that get_model_evaluation_matrix_parallel appended to checkpoint_file.
+
+    Returns:
+        dict: tuple of class names -> result of get_model_scores
+    """
+    return {
+        tuple(result[0]): result for result in __read_results_log(checkpoint_file)
+    }
+
+
+def read_pair_store(pair_store_folder: str, store_keys: list) -> dict:
+    """Reads the results that get_model_evaluation_matrix_parallel wrote to pair_store_folder.
+    Only the files of store_keys are read, keys without a file are left out.
+
+    Returns:
+        dict: key from get_pair_store_key -> result of get_model_scores
+    """
+    store_key_to_result = dict()
+    for store_key in store_keys:
+        entry_path = f"{pair_store_folder}/{store_key}.pickle"
+        if not os.path.isfile(entry_path):
+            continue
+        try:
+            with open(entry_path, "rb") as entry:
+                store_key_to_result[store_key] = pickle.load(entry)
+        except (EOFError, pickle.UnpicklingError) as error:
+            # not written by __write_pair_store_entry, the pair is evaluated again and the file replaced
+            print(f"{entry_path}: ignoring unreadable entry ({error!r})")
+    return store_key_to_result
+
+
+def __write_pair_store_entry(pair_store_folder: str, store_key: str, result):
+    # The entry is written to a temporary file in the same folder and renamed, which is atomic:
+    # other processes either see the complete file or no file. No lock is needed, a concurrent
+    # evaluation of the same pair writes the same result.
+    os.makedirs(pair_store_folder, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=pair_store_folder, suffix=".tmp", delete=False
+    ) as entry:
+        pickle.dump(result, entry)
+    os.replace(entry.name, f"{pair_store_folder}/{store_key}.pickle")
+
+
+def prune_pair_store(pair_store_folder: str, max_age_days: float):
+    """Deletes the entries of pair_store_folder that were written more than max_age_days ago,
+    e.g. results of a previous version of the models. Entries are small, but the folder grows with
+    the number of distinct pairs that were ever evaluated.
+
+    Returns:
+        int: number of deleted entries
+    """
+    min_mtime = time.time() - max_age_days * 24 * 3600
+    n_deleted = 0
+    for entry in os.scandir(pair_store_folder):
+        # also removes temporary files of interrupted writes
+        if entry.name.endswith((".pickle", ".tmp")) and entry.stat().st_mtime < min_mtime:
+            os.remove(entry.path)
+            n_deleted += 1
+    return n_deleted
+
+
+def __hash_protein_set(series_sequences: pd.Series) -> str:
+    hash_object = hashlib.sha256()
+    for accession, sequence in series_sequences.sort_index().items():
+        hash_object.update(f"{accession}\t{sequence}\n".encode())
+    return hash_object.hexdigest()
+
+
+def get_pair_store_key(
+    sequences_label0: pd.Series, sequences_label1: pd.Series, model_parameters: dict
+) -> str:
+    """Identifies the result of one pair of labels independently of the dataset and the label names.
+
+    Args:
+        sequences_label0 (pd.Series): accessions and sequences of the proteins annotated with the first label
+        sequences_label1 (pd.Series): accessions and sequences of the proteins annotated with the second label
+        model_parameters (dict): model and feature parameters, serializable with json
+
+    Returns:
+        str: sha256 of the protein sets, their sequences (which determine the features)
+            and the model parameters
+    """
+    return hashlib.sha256(
+        "\n".join(
+            [
+                __hash_protein_set(sequences_label0),
+                __hash_protein_set(sequences_label1),
+                json.dumps(model_parameters, sort_keys=True),
+            ]
+        ).encode()
+    ).hexdigest()
+
+
+def get_one_vs_rest_decision_values(
+    features_path: str, sample_indices: np.array, y: np.array, n_threads: int = 1
+):
+    """Out-of-fold decision values of a model that separates one GO term (y=1) from all other proteins.
+    Same outer and inner cross validation and parameter grid as model "svc" in get_model_scores.
+    """
+    X = load_shared_features(features_path)[sample_indices]
+    decision_values = np.zeros(len(y))
+    for train_index, test_index in StratifiedKFold(n_splits=5).split(X, y):
+        gs = GridSearchCV(
+            estimator=make_pipeline(StandardScaler(), SVC(class_weight="balanced")),
+            param_grid={"svc__C": [0.1, 1, 10], "svc__gamma": ["scale", "auto"]},
+            scoring=make_scorer(f1_score, average="macro", zero_division=0),
+            n_jobs=n_threads,
+            cv=4,
+        )
+        gs.fit(X[train_index], y[train_index])
+        decision_values[test_index] = gs.decision_function(X[test_index])
+    return decision_values
+
+
+def get_pairwise_scores_from_decision_values(
+    decision_values: np.array,
+    classes: np.array,
+    proteins: np.array,
+    membership: np.array,
+    multi_output: bool = True,
+    min_unique_samples_per_class: int = 15,
+):
+    """Derives the scores for each pair of GO terms from the out-of-fold decision values
+    of the one-vs-rest models, in the same format as get_model_scores.
+
+    multi_output: Proteins annotated with either term are the samples. Each term is predicted
+        if the decision value of its model is positive, then the F1 score is calculated for each term.
+    not multi_output: Only proteins that are annotated with one of the two terms.
+        The term with the higher decision value is predicted.
+
+    There are no inner validation scores, the train scores are NaN.
+    """
+    results = list()
+    for i, j in get_valid_label_pairs(membership, min_unique_samples_per_class):
+        if multi_output:
+            sample_mask = membership[i] | membership[j]
+            y = np.column_stack(
+                [membership[i, sample_mask], membership[j, sample_mask]]
+            ).astype(np.int64)
+            y_pred = np.column_stack(
+                [decision_values[i, sample_mask] > 0, decision_values[j, sample_mask] > 0]
+            ).astype(np.int64)
+        else:
+            sample_mask = membership[i] ^ membership[j]
+            y = membership[j, sample_mask].astype(np.int64)
+            y_pred = (
+                decision_values[j, sample_mask] > decision_values[i, sample_mask]
+            ).astype(np.int64)
+        test_scores = f1_score(
+            y_true=y, y_pred=y_pred, average=None, labels=[0, 1], zero_division=0
+        )
+        results.append(
+            (
+                classes[[i, j]],
+                np.array([np.nan]),
+                np.array([np.nan]),
+                np.array([test_scores[0]]),
+                np.array([test_scores[1]]),
+                y,
+                proteins[sample_mask],
+            )
+        )
+    return results
+
+
+def get_model_evaluation_matrix_one_vs_rest(
+    df_sequences: pd.DataFrame,
+    df_uniprot_goa: pd.DataFrame,
+    exclude_iea: bool = True,
+    standardize_samples: bool = True,
+    multi_output: bool = True,
+    min_samples_per_class: int = 20,
+    min_unique_samples_per_class: int = 15,
+    n_jobs: int = -1,
+    n_jobs_gridsearch: int = 1,
+):
+    """Faster alternative to get_model_evaluation_matrix_parallel for screening larger datasets.
+    Instead of one model per pair of GO terms, one model per GO term is trained (one-vs-rest),
+    and the scores for all pairs are derived from its out-of-fold decision values
+    (see get_pairwise_scores_from_decision_values). The number of models grows linearly with the number of terms.
+    The results have the same format, and the same pairs, as get_model_evaluation_matrix_parallel.
+    Use get_screening_concordance to compare the two.
+    """
+    df_features = calculate_features(
+        df_sequences.sequence, standardize_samples=standardize_samples
+    )
+    dict_label_to_proteins = get_label_to_proteins(
+        df_uniprot_goa=df_uniprot_goa,
+        min_samples_per_class=min_samples_per_class,
+        exclude_iea=exclude_iea,
+    )
+    classes, proteins, membership = get_label_membership_matrix(dict_label_to_proteins)
+    sample_indices = df_features.index.get_indexer(proteins)
+    assert (sample_indices >= 0).all(), "proteins without features in df_features"
+
+    with shared_memory_folder(8 * df_features.size) as features_folder:
+        features_path = f"{features_folder}/features.npy"
+        np.save(features_path, df_features.values.astype(np.float64))
+        decision_values = Parallel(n_jobs=n_jobs, backend="multiprocessing")(
+            delayed(get_one_vs_rest_decision_values)(
+                features_path,
+                sample_indices,
+                membership[i].astype(np.int64),
+                n_threads=n_jobs_gridsearch,
+            )
+            for i in range(len(classes))
+        )
+    return get_pairwise_scores_from_decision_values(
+        decision_values=np.array(decision_values),
+        classes=classes,
+        proteins=proteins,
+        membership=membership,
+        multi_output=multi_output,
+        min_unique_samples_per_class=min_unique_samples_per_class,
+    )
+
+
+def get_screening_concordance(
+    df_test_scores_pairwise: pd.DataFrame, df_test_scores_screening: pd.DataFrame
+) -> pd.Series:
+    """Compares the pairwise test scores matrices (from process_pairwise_eval_results)
+    of get_model_evaluation_matrix_parallel and get_model_evaluation_matrix_one_vs_rest.
+
+    Returns:
+        pd.Series: correlations and differences across all pairs that have a score in both matrices
+    """
+    scores_pairwise = df_test_scores_pairwise.stack().rename("pairwise")
+    scores_screening = df_test_scores_screening.stack().rename("screening")
+    df_scores = pd.concat([scores_pairwise, scores_screening], axis=1).dropna()
+    return pd.Series(
+        [
+            len(df_scores),
+            df_scores.pairwise.corr(df_scores.screening, method="pearson"),
+            df_scores.pairwise.corr(df_scores.screening, method="spearman"),
+            (df_scores.pairwise - df_scores.screening).abs().mean(),
+            (df_scores.screening - df_scores.pairwise).mean(),
+        ],
+        index=["n_pairs", "pearson", "spearman", "mean_absolute_difference", "bias"],
+    )
+
+
 def process_pairwise_eval_results(
     pairwise_eval_results: tuple,
     df_uniprot_goa: pd.DataFrame,
     convert_go_ids_to_terms: bool = True,
+    label_groups: dict = None,
 ):
+    # label_groups: representative -> labels, if only representatives were evaluated (see get_equivalent_label_groups).
+    # The scores of each representative are copied to all labels in its group.
     go_id_to_term = {
         go_id: go_term
         for go_id, go_term in df_uniprot_goa[["go_id_ancestor", "go_term_ancestor"]]
@@ -361,16 +1279,24 @@ def process_pairwise_eval_results(
         y,
         sample_names,
     ) in pairwise_eval_results:
-        go_term0, go_term1 = (
-            [go_id_to_term[go_id] for go_id in class_names]
-            if convert_go_ids_to_terms
-            else list(class_names)
+        go_id_pairs = (
+            itertools.product(
+                label_groups[class_names[0]], label_groups[class_names[1]]
+            )
+            if label_groups
+            else [class_names]
         )
-        records_train.append([go_term0, go_term1, train_scores_label0.mean()])
-        records_train.append([go_term1, go_term0, train_scores_label1.mean()])
-        # records_train.append([go_term1,go_term0,train_scores[1]])
-        records_test.append([go_term0, go_term1, test_scores_label0.mean()])
-        records_test.append([go_term1, go_term0, test_scores_label1.mean()])
+        for go_id_pair in go_id_pairs:
+            go_term0, go_term1 = (
+                [go_id_to_term[go_id] for go_id in go_id_pair]
+                if convert_go_ids_to_terms
+                else list(go_id_pair)
+            )
+            records_train.append([go_term0, go_term1, train_scores_label0.mean()])
+            records_train.append([go_term1, go_term0, train_scores_label1.mean()])
+            # records_train.append([go_term1,go_term0,train_scores[1]])
+            records_test.append([go_term0, go_term1, test_scores_label0.mean()])
+            records_test.append([go_term1, go_term0, test_scores_label1.mean()])
     df_train = pd.DataFrame.from_records(
         records_train, columns=["pos_label", "neg_label", "f1_score"]
     ).pivot(index="pos_label", columns="neg_label", values="f1_score")
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# number of set bits for each possible byte
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class GoProteinIndex:
+    """Inverted index from GO terms to the proteins annotated with them.
+
+    Each GO term has a bitmap over a fixed (sorted) order of all proteins, packed into bytes as in np.packbits.
+    Unions, intersections and counts for sets of GO terms are bitwise operations on these arrays,
+    instead of unions of python sets.
+
+    Example:
+        index = GoProteinIndex.from_annotations(df_uniprot_goa)
+        index.count_union(go_terms_subset) / index.count_union(go_terms_list)  # coverage
+        index.get_proteins(index.union(go_terms_subset))  # set of accessions
+        index.get_overlap_matrix()  # number of shared proteins for each pair of terms
+        index["GO:0022857"]  # set of accessions, like the dict from get_go_id_to_proteins
+    """
+
+    def __init__(self, go_ids: list, proteins: list, bitmaps: np.array):
+        # bitmaps: uint8 array of shape (len(go_ids), ceil(len(proteins) / 8))
+        assert bitmaps.shape == (len(go_ids), (len(proteins) + 7) // 8)
+        self.go_ids = np.array(go_ids, dtype=object)
+        self.proteins = np.array(proteins, dtype=object)
+        self.bitmaps = bitmaps
+        self.go_id_to_position = {go_id: i for i, go_id in enumerate(self.go_ids)}
+
+    @classmethod
+    def from_annotations(
+        cls,
+        df_uniprot_goa: pd.DataFrame,
+        exclude_iea: bool = False,
+        go_id_column: str = "go_id_ancestor",
+    ):
+        """Builds the index from the annotations of get_go_annotations_subset
+
+        Args:
+            df_uniprot_goa (pd.DataFrame): protein annotations with columns Uniprot, evidence_code and go_id_column
+            exclude_iea (bool, optional): Ignore annotations with evidence code IEA. Defaults to False.
+            go_id_column (str, optional): Defaults to "go_id_ancestor", which includes the ancestors of each term.
+        """
+        if exclude_iea:
+            df_uniprot_goa = df_uniprot_goa[df_uniprot_goa.evidence_code != "IEA"]
+        # missing values would get the code -1, i.e. the last term or protein
+        df_uniprot_goa = df_uniprot_goa.dropna(subset=[go_id_column, "Uniprot"])
+        go_codes, go_ids = pd.factorize(df_uniprot_goa[go_id_column], sort=True)
+        protein_codes, proteins = pd.factorize(df_uniprot_goa.Uniprot, sort=True)
+        bitmaps = np.zeros((len(go_ids), (len(proteins) + 7) // 8), dtype=np.uint8)
+        # same bit order as np.packbits: the first protein is the highest bit of the first byte
+        np.bitwise_or.at(
+            bitmaps,
+            (go_codes, protein_codes >> 3),
+            (np.uint8(128) >> (protein_codes & 7)).astype(np.uint8),
+        )
+        return cls(go_ids.tolist(), proteins.tolist(), bitmaps)
+
+    def __len__(self):
+        return len(self.go_ids)
+
+    def __contains__(self, go_id):
+        return go_id in self.go_id_to_position
+
+    def __getitem__(self, go_id) -> set:
+        return self.get_proteins(self.bitmaps[self.go_id_to_position[go_id]])
+
+    def keys(self):
+        return self.go_id_to_position.keys()
+
+    def __get_rows(self, go_ids) -> np.array:
+        return self.bitmaps[[self.go_id_to_position[go_id] for go_id in go_ids]]
+
+    def union(self, go_ids) -> np.array:
+        """Bitmap of the proteins annotated with at least one of the terms"""
+        rows = self.__get_rows(go_ids)
+        if len(rows) == 0:
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(rows, axis=0)
+
+    def intersection(self, go_ids) -> np.array:
+        """Bitmap of the proteins annotated with all of the terms"""
+        rows = self.__get_rows(go_ids)
+        if len(rows) == 0:
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return np.bitwise_and.reduce(rows, axis=0)
+
+    @staticmethod
+    def count(bitmap: np.array) -> int:
+        """Number of proteins in a bitmap, or in each row of a 2d array of bitmaps"""
+        return POPCOUNT_TABLE[bitmap].sum(axis=-1, dtype=np.int64)
+
+    def count_union(self, go_ids) -> int:
+        return int(self.count(self.union(go_ids)))
+
+    def count_intersection(self, go_ids) -> int:
+        return int(self.count(self.intersection(go_ids)))
+
+    def get_proteins(self, bitmap: np.array) -> set:
+        return set(self.proteins[self.__unpack(bitmap)])
+
+    def __unpack(self, bitmaps: np.array) -> np.array:
+        return np.unpackbits(bitmaps, axis=-1, count=len(self.proteins)).astype(bool)
+
+    def get_protein_counts(self) -> pd.Series:
+        """Number of proteins annotated with each term"""
+        return pd.Series(self.count(self.bitmaps), index=self.go_ids, name="n_proteins")
+
+    def get_membership_matrix(self, go_ids) -> np.array:
+        """Boolean matrix of shape (len(go_ids), number of proteins in the index)"""
+        return self.__unpack(self.__get_rows(go_ids))
+
+    def get_overlap_matrix(self, go_ids=None) -> pd.DataFrame:
+        """Number of proteins shared by each pair of terms, the diagonal contains the number of proteins of each term"""
+        go_ids = self.go_ids if go_ids is None else np.array(go_ids, dtype=object)
+        membership = self.get_membership_matrix(go_ids).astype(np.float32)
+        # float32 matrix product uses BLAS, and is exact for counts below 2**24
+        overlaps = (membership @ membership.T).astype(np.int64)
+        return pd.DataFrame(overlaps, index=go_ids, columns=go_ids)
+
+    def to_dict(self, min_proteins: int = 0) -> dict:
+        """GO term -> set of proteins, for the terms with at least min_proteins proteins"""
+        protein_counts = self.count(self.bitmaps)
+        return {
+            go_id: self.get_proteins(bitmap)
+            for go_id, bitmap, protein_count in zip(
+                self.go_ids, self.bitmaps, protein_counts
+            )
+            if protein_count >= min_proteins
+        }
@@ -1,18 +1,48 @@
 import itertools
-from copy import copy
+import multiprocessing
+import hashlib
+import json
 import pandas as pd
 import numpy as np
-import networkx as nx
 import os
-from subpred.go_annotations import get_go_subgraph
+import time
+from pathlib import Path
+from joblib import Parallel, delayed, cpu_count
+from subpred.go_annotations import get_go_subgraph, get_go_levels
+from subpred.go_protein_index import GoProteinIndex
 from subpred.util import load_df
+from subpred.features import FEATURE_TYPES
 from subpred.go_prediction import (
     get_model_evaluation_matrix_parallel,
+    get_model_evaluation_matrix_one_vs_rest,
+    get_equivalent_label_groups,
+    get_label_to_proteins,
     process_pairwise_eval_results,
 )
 
 
+# largest number of GO terms for optimize_subset(..., solver="exact")
+MAX_TERMS_EXACT_SOLVER = 25
+
+
+# go_obo graph by file path and modification time
+GO_GRAPH_CACHE = dict()
+
+
+def __load_go_graph(folder_path: str = "../data/datasets"):
+    # loads the go_obo pickle again only if the file has changed
+    file_path = next(Path(folder_path).glob("go_obo.*"))
+    cache_key = (str(file_path.resolve()), file_path.stat().st_mtime_ns)
+    if cache_key not in GO_GRAPH_CACHE:
+        GO_GRAPH_CACHE.clear()
+        GO_GRAPH_CACHE[cache_key] = load_df("go_obo", folder_path=folder_path)
+    return GO_GRAPH_CACHE[cache_key]
+
+
 def get_proteins(go_set: set, go_id_to_proteins: dict):
+    # go_id_to_proteins: dict of sets, or GoProteinIndex
+    if isinstance(go_id_to_proteins, GoProteinIndex):
+        return go_id_to_proteins.get_proteins(go_id_to_proteins.union(go_set))
 
     protein_set = set()
     for go_term in go_set:
@@ -29,7 +59,7 @@ def get_go_subset(
 ):
 
     graph_go = get_go_subgraph(
-        graph_go=load_df("go_obo"),
+        graph_go=__load_go_graph(),
         root_node=root_node,
         keys={"is_a"},
         namespaces={"molecular_function"},
@@ -73,62 +103,408 @@ def get_go_subset(
     return go_terms_list
 
 
+def get_evaluation_cache_key(
+    df_sequences: pd.DataFrame,
+    df_uniprot_goa: pd.DataFrame,
+    exclude_iea: bool,
+    evaluation_parameters: dict,
+) -> str:
+    """Hash of everything that the pairwise ML results depend on:
+    the GO labels of each protein, the sequences of the labeled proteins (and therefore their features),
+    the feature types, and the model and evaluation parameters.
+    Identical inputs lead to the same key, regardless of the notebook or dataset name.
+    """
+    df_labels = df_uniprot_goa
+    if exclude_iea:
+        df_labels = df_labels[df_labels.evidence_code != "IEA"]
+    df_labels = (
+        df_labels[["Uniprot", "go_id_ancestor"]]
+        .drop_duplicates()
+        .sort_values(["Uniprot", "go_id_ancestor"])
+    )
+    series_sequences = (
+        df_sequences.loc[df_sequences.index.isin(df_labels.Uniprot), "sequence"]
+        .groupby(level=0)
+        .first()
+        .sort_index()
+    )
+    hash_object = hashlib.sha256()
+    for protein, go_id in df_labels.itertuples(index=False):
+        hash_object.update(f"{protein}\t{go_id}\n".encode())
+    for protein, sequence in series_sequences.items():
+        hash_object.update(f">{protein}\n{sequence}\n".encode())
+    hash_object.update(
+        json.dumps(
+            dict(
+                feature_types=FEATURE_TYPES,
+                exclude_iea=exclude_iea,
+                **evaluation_parameters,
+            ),
+            sort_keys=True,
+        ).encode()
+    )
+    return hash_object.hexdigest()
+
+
 def get_pairwise_test_scores(
     df_sequences,
     df_uniprot_goa,
     dataset_name="",
     min_samples_unique=5,
     exclude_iea_go_terms=False,
-    cache_folder=""
+    cache_folder="",
+    evaluation_mode="pairwise",
+    max_jaccard_distance_equivalent_terms=0.0,
 ):
-    if dataset_name:
-        file_name = f"ml_models_min{min_samples_unique}_{dataset_name}.pickle"
+    # evaluation_mode: "pairwise" trains one model per pair of GO terms,
+    # "one_vs_rest" is the faster screening mode from get_model_evaluation_matrix_one_vs_rest
+    # max_jaccard_distance_equivalent_terms: in pairwise mode, GO terms with (nearly) the same proteins
+    # are only evaluated once, see get_equivalent_label_groups. None evaluates all terms.
+    # dataset_name: no longer used. The cache file name is derived from the data and parameters
+    # (see get_evaluation_cache_key), such that changed inputs never return stale results.
+    assert evaluation_mode in {"pairwise", "one_vs_rest"}, evaluation_mode
+    if evaluation_mode == "one_vs_rest":
+        evaluation_function = get_model_evaluation_matrix_one_vs_rest
+        evaluation_parameters = dict(
+            standardize_samples=True,
+            multi_output=True,
+            min_samples_per_class=20,
+            min_unique_samples_per_class=min_samples_unique,
+        )
     else:
-        file_name = f"ml_models_min{min_samples_unique}.pickle"
-
-    if cache_folder:
-        file_name = f"{cache_folder}/{file_name}"
-
-    if not os.path.isfile(file_name):
-        # recalculating with lower threshold to include more terms
-        pairwise_eval_results = get_model_evaluation_matrix_parallel(
-            df_sequences,  # TODO try embeddings here?
-            df_uniprot_goa,
-            exclude_iea=exclude_iea_go_terms,
+        evaluation_function = get_model_evaluation_matrix_parallel
+        evaluation_parameters = dict(
             standardize_samples=True,
             multi_output=True,
+            # recalculating with lower threshold to include more terms
             min_samples_per_class=20,
             min_unique_samples_per_class=min_samples_unique,
             model_name="pbest_svc_multi",  # kbest_svc_multi, pca_svc_multi
             feature_selection_parameters=[10, 20, 50],  # TODO try other model here?
-            n_jobs=-1,
         )
-        df_train_results, df_test_results = process_pairwise_eval_results(
-            pairwise_eval_results, df_uniprot_goa, convert_go_ids_to_terms=False
+    cache_key = get_evaluation_cache_key(
+        df_sequences=df_sequences,
+        df_uniprot_goa=df_uniprot_goa,
+        exclude_iea=exclude_iea_go_terms,
+        evaluation_parameters=dict(
+            evaluation_mode=evaluation_mode,
+            max_jaccard_distance_equivalent_terms=(
+                max_jaccard_distance_equivalent_terms
+                if evaluation_mode == "pairwise"
+                else None
+            ),
+            **evaluation_parameters,
+        ),
+    )
+    file_name = f"ml_models_{cache_key}.pickle"
+    # results of single GO term pairs, shared by all datasets
+    pair_store_folder = "ml_models_pair_store"
+
+    if cache_folder:
+        file_name = f"{cache_folder}/{file_name}"
+        pair_store_folder = f"{cache_folder}/{pair_store_folder}"
+
+    if os.path.isfile(file_name):
+        return pd.read_pickle(file_name)
+
+    label_groups = None
+    if evaluation_mode == "one_vs_rest":
+        pairwise_eval_results = evaluation_function(
+            df_sequences,
+            df_uniprot_goa,
+            exclude_iea=exclude_iea_go_terms,
+            n_jobs=-1,
+            **evaluation_parameters,
         )
-        df_test_scores_new = df_test_results
-        df_test_scores_new.to_pickle(file_name)
     else:
-        df_test_scores_new = pd.read_pickle(file_name)
+        if max_jaccard_distance_equivalent_terms is not None:
+            label_groups = get_equivalent_label_groups(
+                get_label_to_proteins(
+                    df_uniprot_goa=df_uniprot_goa,
+                    min_samples_per_class=evaluation_parameters["min_samples_per_class"],
+                    exclude_iea=exclude_iea_go_terms,
+                ),
+                max_jaccard_distance=max_jaccard_distance_equivalent_terms,
+            )
+        pairwise_eval_results = evaluation_function(
+            df_sequences,  # TODO try embeddings here?
+            df_uniprot_goa,
+            exclude_iea=exclude_iea_go_terms,
+            n_jobs=-1,
+            cache_fold_transforms=True,
+            checkpoint_file=f"{file_name}.partial",
+            pair_store_folder=pair_store_folder,
+            label_groups=label_groups,
+            # runtime of each pair, see get_telemetry_report
+            telemetry_file=f"{file_name}.telemetry.jsonl",
+            verbose=True,
+            **evaluation_parameters,
+        )
+    df_train_results, df_test_results = process_pairwise_eval_results(
+        pairwise_eval_results,
+        df_uniprot_goa,
+        convert_go_ids_to_terms=False,
+        label_groups=label_groups,
+    )
+    df_test_scores_new = df_test_results
+    df_test_scores_new.to_pickle(file_name)
+    if os.path.isfile(f"{file_name}.partial"):
+        os.remove(f"{file_name}.partial")
 
     return df_test_scores_new
 
 
-def get_go_id_to_level(go_terms_list, root_node="GO:0022857"):
-    graph_go = get_go_subgraph(
-        graph_go=load_df("go_obo"),
+def get_go_id_to_level(go_terms_list, root_node="GO:0022857", level="min"):
+    # level: "min" is the number of terms on the shortest path to the root node,
+    # "max" the number of terms on the longest path
+    assert level in {"min", "max"}, level
+    df_levels = get_go_levels(
+        graph_go=__load_go_graph(),
         root_node=root_node,
         keys={"is_a"},
         namespaces={"molecular_function"},
     )
-
-    go_id_to_level = {
-        go_id: len(nx.shortest_path(graph_go, go_id, root_node))
-        for go_id in go_terms_list
-    }
+    go_id_to_level = df_levels.loc[go_terms_list, f"{level}_level"].to_dict()
     return go_id_to_level
 
 
+def __get_mean_score_when_removed(
+    scores_filled: np.array, active: np.array, go_term_position: int
+) -> float:
+    # Exact mean of the off-diagonal scores without one term. Same values and summation order
+    # (column by column) as the mean of the melted data frame, for identical floating point results.
+    remaining = active[active != go_term_position]
+    values = scores_filled[np.ix_(remaining, remaining)].T
+    return values[~np.eye(len(remaining), dtype=bool)].mean()
+
+
+def __get_subset_arrays(
+    go_terms_list: list,
+    df_test_scores: pd.DataFrame,
+    go_id_to_proteins: dict,
+    nan_value: float,
+):
+    # boolean matrix (terms, proteins), and scores in the order of go_terms_list with NaN replaced
+    if isinstance(go_id_to_proteins, GoProteinIndex):
+        membership = go_id_to_proteins.get_membership_matrix(go_terms_list)
+        # only the proteins of these terms
+        membership = membership[:, membership.any(axis=0)]
+    else:
+        proteins = sorted(get_proteins(go_terms_list, go_id_to_proteins))
+        protein_to_position = {protein: i for i, protein in enumerate(proteins)}
+        membership = np.zeros((len(go_terms_list), len(proteins)), dtype=bool)
+        for i, go_term in enumerate(go_terms_list):
+            membership[
+                i,
+                [protein_to_position[protein] for protein in go_id_to_proteins[go_term]],
+            ] = True
+    # NaN means that not enough unique samples (less than MIN_SAMPLES_UNIQUE)
+    scores_filled = df_test_scores.loc[go_terms_list, go_terms_list].values.astype(
+        np.float64
+    )
+    scores_filled[np.isnan(scores_filled)] = nan_value
+    np.fill_diagonal(scores_filled, 0.0)
+    return membership, scores_filled
+
+
+def __get_mean_score(scores_filled: np.array, active: np.array) -> float:
+    # mean of the off-diagonal scores of a subset, the diagonal of scores_filled is 0
+    n_active = active.sum()
+    if n_active < 2:
+        return np.nan
+    return scores_filled[np.ix_(active, active)].sum() / (n_active * (n_active - 1))
+
+
+def __expand_beam_state(
+    membership: np.array,
+    scores_filled: np.array,
+    active: np.array,
+    min_coverage: float,
+    total_proteins_before: int,
+) -> list:
+    # all subsets with one term less that still cover min_coverage of the proteins, and their mean scores
+    positions = np.flatnonzero(active)
+    protein_counts = membership[positions].sum(axis=0)
+    n_unique_proteins = (membership[positions] & (protein_counts == 1)).sum(axis=1)
+    next_coverage = (
+        (protein_counts > 0).sum() - n_unique_proteins
+    ) / total_proteins_before
+    candidates = positions[next_coverage >= min_coverage]
+    n_pairs = (len(positions) - 1) * (len(positions) - 2)
+    if len(candidates) == 0:
+        return list()
+    if n_pairs == 0:
+        # the mean score of less than two terms is not defined, but the subset can still be reduced
+        means = np.full(len(candidates), np.nan)
+    else:
+        scores_active = scores_filled[np.ix_(active, active)]
+        candidate_rows = np.searchsorted(positions, candidates)
+        means = (
+            scores_active.sum()
+            - scores_active.sum(axis=1)[candidate_rows]
+            - scores_active.sum(axis=0)[candidate_rows]
+        ) / n_pairs
+    children = list()
+    for candidate, mean in zip(candidates, means):
+        child = active.copy()
+        child[candidate] = False
+        children.append((mean, child))
+    return children
+
+
+def __optimize_subset_beam(
+    membership: np.array,
+    scores_filled: np.array,
+    min_coverage: float,
+    beam_width: int,
+    n_jobs: int,
+) -> np.array:
+    # Like the greedy algorithm, but each step keeps the beam_width subsets with the highest mean scores.
+    # A subset is finished when no term can be removed without going below min_coverage.
+    # The best finished subset is returned. With beam_width 1, this is the greedy algorithm without tie breakers.
+    # Subsets with less than two terms have no mean score, they are only returned if there is no other subset.
+    total_proteins_before = membership.any(axis=0).sum()
+    beam = [np.ones(len(scores_filled), dtype=bool)]
+    finished = list()
+    while beam:
+        # threads, since the arrays are shared and numpy releases the GIL
+        expansions = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(__expand_beam_state)(
+                membership, scores_filled, active, min_coverage, total_proteins_before
+            )
+            for active in beam
+        )
+        children = list()
+        for active, children_active in zip(beam, expansions):
+            if not children_active:
+                finished.append((__get_mean_score(scores_filled, active), active))
+            children.extend(children_active)
+        # subsets that are reached by removing the same terms in a different order are only kept once
+        children = sorted(
+            children, key=lambda x: -np.inf if np.isnan(x[0]) else x[0], reverse=True
+        )
+        beam = list()
+        seen = set()
+        for _, child in children:
+            key = child.tobytes()
+            if key in seen:
+                continue
+            seen.add(key)
+            beam.append(child)
+            if len(beam) == beam_width:
+                break
+    finished_scored = [(mean, active) for mean, active in finished if not np.isnan(mean)]
+    if not finished_scored:
+        # e.g. a single term covers min_coverage of the proteins, then no subset with two terms is minimal
+        return finished[0][1]
+    return max(finished_scored, key=lambda x: x[0])[1]
+
+
+def __optimize_subset_exact(
+    membership: np.array,
+    scores_filled: np.array,
+    min_coverage: float,
+    initial_subset: np.array,
+) -> np.array:
+    # Branch and bound over all subsets where no term can be removed without going below min_coverage,
+    # for the subset with the highest mean score. initial_subset (e.g. from the beam search) is the first incumbent.
+    n_terms = len(scores_filled)
+    assert n_terms <= MAX_TERMS_EXACT_SOLVER, f"at most {MAX_TERMS_EXACT_SOLVER} terms"
+    # symmetric scores have the same mean over a subset
+    scores_symmetric = (scores_filled + scores_filled.T) / 2
+    # terms with high average scores first, to find good subsets early
+    order = np.argsort(-scores_symmetric.sum(axis=1), kind="stable")
+    scores_symmetric = scores_symmetric[np.ix_(order, order)]
+    # proteins as bits of python integers
+    protein_bits = [
+        int.from_bytes(np.packbits(row, bitorder="little").tobytes(), "little")
+        for row in membership[order]
+    ]
+    suffix_bits = [0] * (n_terms + 1)
+    for position in range(n_terms - 1, -1, -1):
+        suffix_bits[position] = suffix_bits[position + 1] | protein_bits[position]
+    total_proteins_before = suffix_bits[0].bit_count()
+
+    def is_covered(bits: int) -> bool:
+        return bits.bit_count() / total_proteins_before >= min_coverage
+
+    def get_upper_bound(included: list, position: int) -> float:
+        # The mean over a subset of size k is the average over its terms of the mean score of each term
+        # with the other k-1 terms. For each term, that is at most the sum with the included terms plus
+        # the highest scores with undecided terms, divided by k-1. The bound for size k is the average of
+        # these values over the included terms and the best undecided terms.
+        undecided = np.arange(position, n_terms)
+        n_included = len(included)
+        scores_to_included = scores_symmetric[:, included].sum(axis=1)
+        scores_undecided = scores_symmetric[:, undecided].copy()
+        # a term is not one of its own partners
+        scores_undecided[undecided, np.arange(len(undecided))] = -np.inf
+        cumulative_sums = np.zeros((n_terms, len(undecided) + 1))
+        cumulative_sums[:, 1:] = np.cumsum(-np.sort(-scores_undecided, axis=1), axis=1)
+        # columns: number of picked undecided terms
+        n_picked = np.arange(len(undecided) + 1)
+        n_subset = n_included + n_picked
+        is_valid = n_subset >= 2
+        n_picked, n_subset = n_picked[is_valid], n_subset[is_valid]
+        if len(n_subset) == 0:
+            return -np.inf
+        sums_included = (
+            (scores_to_included[included, None] + cumulative_sums[included][:, n_picked])
+            / (n_subset - 1)
+        ).sum(axis=0)
+        term_bounds_undecided = (
+            scores_to_included[undecided, None]
+            + cumulative_sums[undecided][:, np.maximum(n_picked - 1, 0)]
+        ) / (n_subset - 1)
+        # sum of the n_picked highest values in each column
+        best_undecided = np.zeros((len(undecided) + 1, len(n_picked)))
+        best_undecided[1:] = np.cumsum(-np.sort(-term_bounds_undecided, axis=0), axis=0)
+        sums_undecided = best_undecided[n_picked, np.arange(len(n_picked))]
+        upper_bound = ((sums_included + sums_undecided) / n_subset).max()
+        return upper_bound
+
+    best = [__get_mean_score(scores_filled, initial_subset), None]
+
+    def search(position: int, included: list, included_bits: int):
+        if not is_covered(included_bits | suffix_bits[position]):
+            return
+        if position == n_terms:
+            if len(included) >= 2:
+                mean = scores_symmetric[np.ix_(included, included)].sum() / (
+                    len(included) * (len(included) - 1)
+                )
+                if np.isnan(best[0]) or mean > best[0]:
+                    best[0], best[1] = mean, list(included)
+            return
+        if not np.isnan(best[0]) and get_upper_bound(included, position) <= best[0]:
+            return
+        # include the term, if none of the included terms becomes redundant
+        included_new = included + [position]
+        bits_new = included_bits | protein_bits[position]
+        # proteins of all other included terms, from prefix and suffix unions
+        prefix_bits = [0]
+        for term in included_new:
+            prefix_bits.append(prefix_bits[-1] | protein_bits[term])
+        suffix_bits_included = [0]
+        for term in reversed(included_new):
+            suffix_bits_included.append(suffix_bits_included[-1] | protein_bits[term])
+        suffix_bits_included.reverse()
+        is_minimal = not any(
+            is_covered(prefix_bits[i] | suffix_bits_included[i + 1])
+            for i in range(len(included_new))
+        )
+        if is_minimal:
+            search(position + 1, included_new, bits_new)
+        search(position + 1, included, included_bits)
+
+    search(0, list(), 0)
+    if best[1] is None:
+        return initial_subset
+    subset = np.zeros(n_terms, dtype=bool)
+    subset[order[best[1]]] = True
+    return subset
+
+
 def optimize_subset(
     go_terms_list: list,
     df_test_scores: pd.DataFrame,
@@ -140,46 +516,90 @@ def optimize_subset(
     prefer_abstract_terms: bool = False,
     verbose: bool = True,
     random_seed: int = 1,
+    solver: str = "greedy",
+    beam_width: int = 10,
+    n_jobs: int = 1,
 ):
-    total_proteins_before = len(get_proteins(go_terms_list, go_id_to_proteins))
-    current_subset = copy(go_terms_list)
-    df_test_scores_subset = df_test_scores.loc[go_terms_list, go_terms_list]
-    random_generator = np.random.default_rng(seed=random_seed)
-    while True:
-        go_term_to_f1_when_removed = list()
-        for go_term in current_subset:
-            next_potential_subset = list(filter(lambda x: x != go_term, current_subset))
-            next_coverage = (
-                len(get_proteins(set(next_potential_subset), go_id_to_proteins))
-                / total_proteins_before
+    # solver:
+    #   "greedy": removes one term at a time, see below
+    #   "beam": keeps the beam_width best subsets in each step, and expands them with n_jobs threads
+    #   "exact": branch and bound for at most MAX_TERMS_EXACT_SOLVER terms, starting from the beam search result
+    # "beam" and "exact" return the subset with the highest mean score among the subsets where no term
+    # can be removed without going below min_coverage. epsilon_f1, prefer_abstract_terms and random_seed
+    # are tie breakers of the greedy algorithm, and are not used by the other solvers.
+    #
+    # Greedy algorithm: in each step, remove the term that leads to the highest mean F1 score
+    # of the remaining pairs, as long as the remaining terms cover min_coverage of the proteins.
+    #
+    # The mean without each term is updated from running row and column sums of the score matrix,
+    # and the coverage from the number of terms in the subset that are annotated to each protein.
+    # Only the terms that are close to the best score are recalculated exactly, such that
+    # the selection (including ties, tie breakers and random draws) does not depend on rounding errors.
+    assert solver in {"greedy", "beam", "exact"}, solver
+    membership, scores_filled = __get_subset_arrays(
+        go_terms_list, df_test_scores, go_id_to_proteins, nan_value
+    )
+    if solver in {"beam", "exact"}:
+        subset = __optimize_subset_beam(
+            membership, scores_filled, min_coverage, beam_width, n_jobs
+        )
+        if solver == "exact":
+            subset = __optimize_subset_exact(
+                membership, scores_filled, min_coverage, initial_subset=subset
             )
-            if next_coverage < min_coverage:
-                continue
+        if verbose:
+            print(solver, __get_mean_score(scores_filled, subset))
+        return [go_terms_list[i] for i in np.flatnonzero(subset)]
 
-            # remove go term, save average and min f1 across all pairs
-            df_test_scores_subset_new = df_test_scores_subset.loc[
-                next_potential_subset, next_potential_subset
-            ]
+    go_term_to_position = {go_term: i for i, go_term in enumerate(go_terms_list)}
+    total_proteins_before = membership.shape[1]
+    protein_counts = membership.sum(axis=0)
+    row_sums = scores_filled.sum(axis=1)
+    column_sums = scores_filled.sum(axis=0)
+    total_sum = row_sums.sum()
+    is_active = np.ones(len(go_terms_list), dtype=bool)
 
-            # Only keep non-diagonal values, replace NaN with 0 for calculating the average
-            df_test_scores_subset_new_long = df_test_scores_subset_new.melt(
-                ignore_index=False, value_name="f1_score"
-            ).reset_index()
-            df_test_scores_subset_new_long = df_test_scores_subset_new_long[
-                df_test_scores_subset_new_long.pos_label
-                != df_test_scores_subset_new_long.neg_label
+    random_generator = np.random.default_rng(seed=random_seed)
+    while True:
+        active = np.flatnonzero(is_active)
+        # proteins that are only annotated with one term are lost when removing it
+        n_unique_proteins = (membership[active] & (protein_counts == 1)).sum(axis=1)
+        n_covered_proteins = (protein_counts > 0).sum()
+        next_coverage = (n_covered_proteins - n_unique_proteins) / total_proteins_before
+        candidates = active[next_coverage >= min_coverage]
+        if len(candidates) < 1:
+            break
+
+        if verbose:
+            # printed below: the exact scores of all candidates, not only of those that pass the prefilter
+            go_term_to_f1_when_removed_all = sorted(
+                [
+                    (
+                        go_terms_list[candidate],
+                        __get_mean_score_when_removed(scores_filled, active, candidate),
+                    )
+                    for candidate in candidates
+                ],
+                key=lambda x: x[1],
+                reverse=True,
+            )
+        n_pairs = (len(active) - 1) * (len(active) - 2)
+        if n_pairs > 0:
+            # TODO try min and max, maybe adjust max_value as well
+            approximate_means = (
+                total_sum - row_sums[candidates] - column_sums[candidates]
+            ) / n_pairs
+            # tolerance is far above the accumulated rounding error of the running sums
+            candidates = candidates[
+                approximate_means >= approximate_means.max() - epsilon_f1 - 1e-6
             ]
-            df_test_scores_subset_new_long.f1_score = df_test_scores_subset_new_long.f1_score.transform(
-                # means that not enough unique samples (less than MIN_SAMPLES_UNIQUE)
-                lambda s: nan_value if np.isnan(s) else s
+        go_term_to_f1_when_removed = [
+            (
+                go_terms_list[candidate],
+                __get_mean_score_when_removed(scores_filled, active, candidate),
             )
-            f1_when_removed = (
-                df_test_scores_subset_new_long.f1_score.mean()
-            )  # TODO try min and max, maybe adjust max_value as well
-            go_term_to_f1_when_removed.append((go_term, f1_when_removed))
-
-        if len(go_term_to_f1_when_removed) < 1:
-            break
+            for candidate in candidates
+        ]
 
         go_term_to_f1_when_removed = sorted(
             go_term_to_f1_when_removed, key=lambda x: x[1], reverse=True
@@ -211,14 +631,19 @@ def optimize_subset(
 
         # tie breaker 2: random sample.
         go_term_to_remove = random_generator.choice(possible_go_terms_to_remove)
-        current_subset = list(filter(lambda x: x != go_term_to_remove, current_subset))
+        position = go_term_to_position[go_term_to_remove]
+        is_active[position] = False
+        total_sum -= row_sums[position] + column_sums[position]
+        row_sums -= scores_filled[:, position]
+        column_sums -= scores_filled[position, :]
+        protein_counts -= membership[position]
 
         if verbose:
             print(possible_go_terms_to_remove_levels)
             print(max_value)
-            print(go_term_to_f1_when_removed)
+            print(go_term_to_f1_when_removed_all)
             print(possible_go_terms_to_remove)
-    return current_subset
+    return [go_terms_list[i] for i in np.flatnonzero(is_active)]
 
 
 def count_nans_nondiag(df):
@@ -231,9 +656,14 @@ def get_subset_eval(
     go_id_to_proteins: dict,
     df_test_scores_new: pd.DataFrame,
 ):
-    coverage = len(get_proteins(go_terms_subset, go_id_to_proteins)) / len(
-        get_proteins(all_proteins, go_id_to_proteins)
-    )
+    if isinstance(go_id_to_proteins, GoProteinIndex):
+        coverage = go_id_to_proteins.count_union(
+            go_terms_subset
+        ) / go_id_to_proteins.count_union(all_proteins)
+    else:
+        coverage = len(get_proteins(go_terms_subset, go_id_to_proteins)) / len(
+            get_proteins(all_proteins, go_id_to_proteins)
+        )
     df_scores_subset = df_test_scores_new.loc[go_terms_subset, go_terms_subset]
     mean = df_scores_subset.mean(axis=None, skipna=True)
     median = df_scores_subset.median(axis=None, skipna=True)
@@ -259,6 +689,47 @@ def get_go_id_to_proteins(df_uniprot_goa):
     return go_id_to_proteins
 
 
+def __get_subset_inputs(
+    df_uniprot_goa,
+    df_sequences,
+    root_node,
+    min_samples_per_term,
+    max_samples_percentile,
+    min_unique_samples_per_term,
+    excluded_terms,
+    cache_folder,
+    evaluation_mode,
+    go_level,
+):
+    # inputs of optimize_subset that do not depend on the optimization parameters
+    # same proteins as get_go_id_to_proteins, as bitmaps
+    go_id_to_proteins = GoProteinIndex.from_annotations(df_uniprot_goa)
+
+    go_terms_list = get_go_subset(
+        df_uniprot_goa=df_uniprot_goa,
+        root_node=root_node,
+        min_samples=min_samples_per_term,
+        max_samples_percentile=max_samples_percentile,
+        excluded_terms=excluded_terms,
+    )
+
+    go_id_to_level = get_go_id_to_level(
+        go_terms_list, root_node=root_node, level=go_level
+    )
+
+    goa_has_iea_annotations = "IEA" in df_uniprot_goa.evidence_code.unique()
+
+    df_test_scores_new = get_pairwise_test_scores(
+        df_sequences=df_sequences,
+        df_uniprot_goa=df_uniprot_goa,
+        min_samples_unique=min_unique_samples_per_term,
+        exclude_iea_go_terms=not goa_has_iea_annotations,
+        cache_folder=cache_folder,
+        evaluation_mode=evaluation_mode,
+    )
+    return go_id_to_proteins, go_terms_list, go_id_to_level, df_test_scores_new
+
+
 def subset_pipeline(
     df_uniprot_goa,
     df_sequences,
@@ -278,7 +749,11 @@ def subset_pipeline(
     # exclude_iea_go_terms=False,
     dataset_name="",
     cache_folder="../data/intermediate/notebooks_cache",
-    external_subset=None
+    external_subset=None,
+    evaluation_mode="pairwise",
+    go_level="min",
+    solver="greedy",
+    beam_width=10,
 ):
     """Reduces a set of GO terms to a subset according to specified parameters, using a greedy algorithm.
 
@@ -311,36 +786,40 @@ def subset_pipeline(
         random_seed (int, optional): The last tie breaker is a random draw with a numpy random generator, this is the random seed for that. Defaults to 1.
         return_scores (bool, optional): If false, only the final subset is returned. If true, returns the subset and the matrix of pairwise F1 scores. Defaults to True.
         return_baseline_scores (bool, optional): Skip all calculations and only return the pairwise F1 scores for the unoptimized dataset. Defaults to False.
-        dataset_name (str, optional): Used for distinguishing between the ML results in the cache_folder. 
-            Important: Use a different dataset_name when using a different df_sequences/df_uniprot_goa.
+        dataset_name (str, optional): Not used anymore. The ML results in the cache_folder are identified by a hash
+            of the proteins, their sequences and GO labels, and the model parameters (see get_evaluation_cache_key).
             Defaults to "".
         cache_folder (str, optional): Folder for storing the cached pairwise ML results. Defaults to "../data/intermediate/notebooks_cache".
         external_subset: Skip all calculations, use eval functions on this subset instead.
+        evaluation_mode (str, optional): "pairwise" trains one ML model per pair of GO terms.
+            "one_vs_rest" trains one model per GO term and derives the pairwise scores from it,
+            which is much faster for large datasets but only approximates the pairwise scores. Defaults to "pairwise".
+        go_level (str, optional): Distance to the root node for the tie breaker with prefer_abstract_terms.
+            "min" is the shortest path to the root node, "max" the longest path. Defaults to "min".
+        solver (str, optional): "greedy", "beam" or "exact", see optimize_subset. epsilon_f1, prefer_abstract_terms
+            and random_seed are only used by "greedy". Defaults to "greedy".
+        beam_width (int, optional): Number of subsets that are kept in each step of the solvers "beam" and "exact".
+            Defaults to 10.
     Returns:
         Optimized GO subset
         Pairwise F1 scores (optional)
     """
-    go_id_to_proteins = get_go_id_to_proteins(df_uniprot_goa)
-
-    go_terms_list = get_go_subset(
+    (
+        go_id_to_proteins,
+        go_terms_list,
+        go_id_to_level,
+        df_test_scores_new,
+    ) = __get_subset_inputs(
         df_uniprot_goa=df_uniprot_goa,
+        df_sequences=df_sequences,
         root_node=root_node,
-        min_samples=min_samples_per_term,
+        min_samples_per_term=min_samples_per_term,
         max_samples_percentile=max_samples_percentile,
+        min_unique_samples_per_term=min_unique_samples_per_term,
         excluded_terms=excluded_terms,
-    )
-
-    go_id_to_level = get_go_id_to_level(go_terms_list, root_node=root_node)
-
-    goa_has_iea_annotations = "IEA" in df_uniprot_goa.evidence_code.unique()
-
-    df_test_scores_new = get_pairwise_test_scores(
-        df_sequences=df_sequences,
-        df_uniprot_goa=df_uniprot_goa,
-        min_samples_unique=min_unique_samples_per_term,
-        exclude_iea_go_terms=not goa_has_iea_annotations,
-        dataset_name=dataset_name,
         cache_folder=cache_folder,
+        evaluation_mode=evaluation_mode,
+        go_level=go_level,
     )
     if return_baseline_scores:
         scores_before = get_subset_eval(
@@ -376,6 +855,8 @@ def subset_pipeline(
         prefer_abstract_terms=prefer_abstract_terms,
         verbose=verbose,
         random_seed=random_seed,
+        solver=solver,
+        beam_width=beam_width,
     )
     scores_after = get_subset_eval(
         go_terms_subset=optimized_subset,
@@ -388,3 +869,102 @@ def subset_pipeline(
         return optimized_subset, scores_after
 
     return optimized_subset
+
+
+# inputs of subset_pipeline_sweep in the worker processes
+SWEEP_INPUTS = dict()
+
+
+def __init_sweep_worker(sweep_inputs: dict):
+    SWEEP_INPUTS.update(sweep_inputs)
+
+
+def __run_sweep_configuration(parameters: dict) -> dict:
+    start_time = time.perf_counter()
+    optimized_subset = optimize_subset(
+        go_terms_list=SWEEP_INPUTS["go_terms_list"],
+        df_test_scores=SWEEP_INPUTS["df_test_scores"],
+        go_id_to_proteins=SWEEP_INPUTS["go_id_to_proteins"],
+        go_id_to_level=SWEEP_INPUTS["go_id_to_level"],
+        verbose=False,
+        **parameters,
+    )
+    scores_after = get_subset_eval(
+        go_terms_subset=optimized_subset,
+        all_proteins=SWEEP_INPUTS["go_terms_list"],
+        go_id_to_proteins=SWEEP_INPUTS["go_id_to_proteins"],
+        df_test_scores_new=SWEEP_INPUTS["df_test_scores"],
+    )
+    return dict(
+        parameters,
+        **scores_after.to_dict(),
+        runtime=time.perf_counter() - start_time,
+        subset=optimized_subset,
+    )
+
+
+def subset_pipeline_sweep(
+    df_uniprot_goa,
+    df_sequences,
+    parameter_grid: dict,
+    root_node="GO:0022857",
+    min_samples_per_term=20,
+    max_samples_percentile: int = None,
+    min_unique_samples_per_term=5,
+    excluded_terms=None,
+    cache_folder="../data/intermediate/notebooks_cache",
+    evaluation_mode="pairwise",
+    go_level="min",
+    n_jobs: int = -1,
+) -> pd.DataFrame:
+    """Runs subset_pipeline for all combinations of optimization parameters.
+    The GO terms, levels, annotations and pairwise scores are calculated once, and are shared
+    by the worker processes that run the optimization for each combination.
+
+    Args:
+        df_uniprot_goa, df_sequences, root_node, min_samples_per_term, max_samples_percentile,
+        min_unique_samples_per_term, excluded_terms, cache_folder, evaluation_mode, go_level: see subset_pipeline
+        parameter_grid (dict): parameter name -> list of values, for the parameters of optimize_subset:
+            min_coverage, epsilon_f1, nan_value, prefer_abstract_terms, random_seed, solver, beam_width.
+            Example: {"min_coverage": [0.7, 0.8, 0.9], "random_seed": [1, 2, 3]}
+            Comparing the solvers: {"solver": ["greedy", "beam", "exact"], "min_coverage": [0.8]}
+        n_jobs (int, optional): Number of processes, negative values as in joblib. Defaults to -1.
+
+    Returns:
+        pd.DataFrame: One row per parameter combination, with the parameters, the scores
+            from get_subset_eval, the runtime of the optimization in seconds, and the optimized subset.
+    """
+    configurations = [
+        dict(zip(parameter_grid.keys(), values))
+        for values in itertools.product(*parameter_grid.values())
+    ]
+    if not configurations:
+        # a parameter without values, nothing to evaluate
+        return pd.DataFrame(columns=list(parameter_grid.keys()))
+    go_id_to_proteins, go_terms_list, go_id_to_level, df_test_scores = __get_subset_inputs(
+        df_uniprot_goa=df_uniprot_goa,
+        df_sequences=df_sequences,
+        root_node=root_node,
+        min_samples_per_term=min_samples_per_term,
+        max_samples_percentile=max_samples_percentile,
+        min_unique_samples_per_term=min_unique_samples_per_term,
+        excluded_terms=excluded_terms,
+        cache_folder=cache_folder,
+        evaluation_mode=evaluation_mode,
+        go_level=go_level,
+    )
+    sweep_inputs = dict(
+        go_id_to_proteins=go_id_to_proteins,
+        go_terms_list=go_terms_list,
+        go_id_to_level=go_id_to_level,
+        df_test_scores=df_test_scores.loc[go_terms_list, go_terms_list],
+    )
+    n_jobs = n_jobs if n_jobs > 0 else cpu_count() + n_jobs + 1
+    # the inputs are sent to each worker once, not with every configuration
+    with multiprocessing.Pool(
+        processes=min(n_jobs, len(configurations)),
+        initializer=__init_sweep_worker,
+        initargs=(sweep_inputs,),
+    ) as pool:
+        records = pool.map(__run_sweep_configuration, configurations)
+    return pd.DataFrame.from_records(records)
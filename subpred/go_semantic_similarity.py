@@ -1,11 +1,42 @@
-from rpy2.robjects import r, StrVector, packages, pandas2ri
-import rpy2.robjects as ro
+import math
+import os
+import tempfile
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+import networkx as nx
+from scipy.sparse import csr_matrix
+from joblib import Parallel, delayed, cpu_count
+from subpred.go_annotations import get_go_subgraph
+from subpred.semantic_similarity_cache import SemanticSimilarityCache
+from subpred.util import load_df
+
+ONTOLOGY_ROOTS = {"MF": "GO:0003674", "BP": "GO:0008150", "CC": "GO:0005575"}
+ONTOLOGY_NAMESPACES = {
+    "MF": "molecular_function",
+    "BP": "biological_process",
+    "CC": "cellular_component",
+}
+ONTOLOGY_ASPECTS = {"MF": "F", "BP": "P", "CC": "C"}
+ORGANISM_IDS = {"yeast": 559292}
+IC_MEASURES = {"Resnik", "Lin", "Rel", "Jiang"}
+# edge weights of the Wang method, as in GOSemSim. Other relations get WANG_WEIGHT_OTHER.
+WANG_WEIGHTS = {"is_a": 0.8, "part_of": 0.6}
+WANG_WEIGHT_OTHER = 0.7
+# index of the first set element in each byte from np.packbits, 8 for empty bytes
+FIRST_BIT_TABLE = np.array([8 - i.bit_length() for i in range(256)], dtype=np.int64)
+# upper limit for the temporary arrays of one row block
+MAX_BLOCK_BYTES = 1 << 26
 
 
 def get_semantic_similarities(
     go_terms, measure, organism, ont="MF", tcss_cutoff="NULL"
 ):
     # DOC: https://yulab-smu.top/biomedical-knowledge-mining-book/GOSemSim.html
+    # R is only needed here, get_semantic_similarities_native does not use it
+    from rpy2.robjects import r, packages, pandas2ri
+    import rpy2.robjects as ro
+
     assert measure in {"Resnik", "Lin", "Rel", "Jiang", "TCSS", "Wang"}
     assert organism in {"yeast"}
     assert ont in {"CC", "MF", "BP"}
@@ -65,6 +96,585 @@ def get_semantic_similarities(
     return df_go_similarity
 
 
+# sub-ontologies from __get_ontology_graph, by (ontology version, ont, relations)
+ONTOLOGY_GRAPH_CACHE = dict()
+
+
+def __get_ontology_graph(graph_go, ont: str, keys: set):
+    version = graph_go.graph.get("data-version")
+    cache_key = (version, ont, frozenset(keys))
+    if version and cache_key in ONTOLOGY_GRAPH_CACHE:
+        return ONTOLOGY_GRAPH_CACHE[cache_key]
+    # copy of the nested subgraph views, traversals on views are much slower
+    graph_ontology = get_go_subgraph(
+        graph_go=graph_go,
+        root_node=ONTOLOGY_ROOTS[ont],
+        keys=keys,
+        namespaces={ONTOLOGY_NAMESPACES[ont]},
+    ).copy()
+    if version:
+        ONTOLOGY_GRAPH_CACHE[cache_key] = graph_ontology
+    return graph_ontology
+
+
+def get_information_content(
+    graph_go,
+    df_go_annotations: pd.DataFrame,
+    ont: str = "MF",
+    proteins_subset: set = None,
+    keys: set = {"is_a", "part_of"},
+) -> pd.Series:
+    """Information content of each term in the ontology, calculated as in the godata function of GOSemSim:
+    The annotations of a term are its direct annotations plus those of all its descendants,
+    and IC = -log(annotations of the term / all annotations). Terms without annotations have an IC of inf.
+
+    Args:
+        graph_go: go_obo graph
+        df_go_annotations (pd.DataFrame): the go pickle, with columns Uniprot, qualifier, go_id, evidence_code, aspect
+        ont (str, optional): One of MF, BP, CC. Defaults to "MF".
+        proteins_subset (set, optional): Only count the annotations of these proteins, e.g. of an organism.
+            Defaults to None, which means all proteins.
+        keys (set, optional): Relations for finding the descendants of a term. Defaults to {"is_a", "part_of"}.
+
+    Returns:
+        pd.Series: IC for each term of the ontology
+    """
+    graph_ontology = __get_ontology_graph(graph_go, ont, keys)
+    go_id_update_dict = {
+        alt_id: go_id
+        for go_id, alt_ids in graph_ontology.nodes(data="alt_id")
+        for alt_id in (alt_ids if alt_ids else [])
+    }
+    go_id_update_dict.update({go_id: go_id for go_id in graph_ontology.nodes()})
+
+    df_go_annotations = df_go_annotations[
+        (df_go_annotations.aspect == ONTOLOGY_ASPECTS[ont])
+        & ~df_go_annotations.qualifier.str.startswith("NOT", na=False)
+    ]
+    if proteins_subset is not None:
+        df_go_annotations = df_go_annotations[
+            df_go_annotations.Uniprot.isin(proteins_subset)
+        ]
+    df_go_annotations = df_go_annotations.assign(
+        go_id=df_go_annotations.go_id.map(go_id_update_dict)
+    ).dropna(subset="go_id")
+    # GOSemSim counts one annotation per gene, term and evidence code
+    annotation_counts = df_go_annotations.drop_duplicates(
+        ["Uniprot", "go_id", "evidence_code"]
+    ).go_id.value_counts()
+
+    go_ids = list(graph_ontology.nodes())
+    go_id_to_position = {go_id: i for i, go_id in enumerate(go_ids)}
+    cumulative_counts = np.zeros(len(go_ids))
+    # edges point from child to parent, nx.descendants returns the GO ancestors
+    for go_id, annotation_count in annotation_counts.items():
+        positions = [go_id_to_position[go_id]] + [
+            go_id_to_position[ancestor]
+            for ancestor in nx.descendants(graph_ontology, go_id)
+        ]
+        cumulative_counts[positions] += annotation_count
+    with np.errstate(divide="ignore"):
+        information_content = -np.log(cumulative_counts / annotation_counts.sum())
+    return pd.Series(information_content, index=go_ids, name="information_content")
+
+
+def __get_ancestor_weights(graph_ontology, go_terms: list, edge_weights: dict):
+    # Returns the terms and their ancestors, parents first, and a matrix with the S-values of the Wang method:
+    # weights[i, j] is the highest product of edge weights on a path from term i up to term j,
+    # 1 on the diagonal and 0 if j is not an ancestor of i. (weights > 0) is the ancestor closure.
+    universe = set()
+    for go_id in go_terms:
+        universe |= {go_id} | nx.descendants(graph_ontology, go_id)
+    graph_universe = graph_ontology.subgraph(universe)
+    go_ids = list(reversed(list(nx.topological_sort(graph_universe))))
+    go_id_to_position = {go_id: i for i, go_id in enumerate(go_ids)}
+    weights = np.zeros((len(go_ids), len(go_ids)))
+    for i, go_id in enumerate(go_ids):
+        # all rows of the parents are complete, since parents come first
+        for _, parent, key in graph_universe.out_edges(go_id, keys=True):
+            weights[i] = np.maximum(
+                weights[i],
+                edge_weights.get(key, WANG_WEIGHT_OTHER)
+                * weights[go_id_to_position[parent]],
+            )
+        weights[i, i] = 1.0
+    return go_ids, weights
+
+
+def __get_row_blocks(n_rows: int, bytes_per_row: int, n_jobs: int) -> list:
+    n_jobs = n_jobs if n_jobs > 0 else cpu_count() + n_jobs + 1
+    n_blocks = max(n_jobs, math.ceil(n_rows * bytes_per_row / MAX_BLOCK_BYTES))
+    return [
+        block
+        for block in np.array_split(np.arange(n_rows), min(n_blocks, max(n_rows, 1)))
+        if len(block)
+    ]
+
+
+def __get_mica_block(
+    ancestors_block: np.array, ancestors: np.array, ic_sorted: np.array
+) -> np.array:
+    # Ancestors are bitsets from np.packbits in the order of descending IC, viewed as uint64 words.
+    # The first common ancestor in this order is the most informative common ancestor (MICA).
+    common_ancestors = ancestors_block[:, None, :] & ancestors[None, :, :]
+    first_word = (common_ancestors != 0).argmax(axis=2)
+    word = np.take_along_axis(common_ancestors, first_word[..., None], axis=2)
+    # the bytes of each word in memory order, which is the order of np.packbits
+    word_bytes = word.view(np.uint8)
+    first_byte = (word_bytes != 0).argmax(axis=2)
+    byte = np.take_along_axis(word_bytes, first_byte[..., None], axis=2)[..., 0]
+    mica = np.where(
+        byte > 0,
+        (first_word * 8 + first_byte) * 8 + FIRST_BIT_TABLE[byte],
+        len(ic_sorted) - 1,
+    )
+    return ic_sorted[mica]
+
+
+def __get_wang_block(
+    weights_block: np.array,
+    ancestors_block: np.array,
+    weights: np.array,
+    ancestors: np.array,
+) -> np.array:
+    # sum of the S-values of both terms over their common ancestors.
+    # ancestors is (weights > 0) as floats, for BLAS matrix products
+    return weights_block @ ancestors.T + ancestors_block @ weights.T
+
+
+def get_semantic_similarity_matrix(
+    go_terms: list,
+    measure: str,
+    graph_go,
+    information_content: pd.Series = None,
+    ont: str = "MF",
+    keys: set = {"is_a", "part_of"},
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """Semantic similarity of all pairs of GO terms, without R.
+
+    The measures follow the definitions in GOSemSim (mgoSim with combine=NULL):
+        Resnik: IC of the most informative common ancestor (MICA), divided by the highest IC in the ontology
+        Lin: 2 * IC(MICA) / (IC1 + IC2)
+        Jiang: 1 - min(1, IC1 + IC2 - 2 * IC(MICA))
+        Rel: Lin * (1 - exp(-IC(MICA)))
+        Wang: S-values from the edge weights in WANG_WEIGHTS, no IC needed
+    Terms count as their own ancestors. Pairs with a term that is not in the ontology,
+    or that has no annotations for the IC measures, are NaN.
+
+    All pairs are calculated at once from the ancestor closure of the terms, in blocks of rows:
+    For the IC measures, the ancestors are bitsets in order of descending IC, and the MICA is the
+    first common element. For Wang, the sums over the common ancestors are matrix products.
+
+    Args:
+        go_terms (list): GO identifiers
+        measure (str): One of "Resnik", "Lin", "Rel", "Jiang", "Wang"
+        graph_go: go_obo graph
+        information_content (pd.Series, optional): from get_information_content. Required for the IC measures.
+        ont (str, optional): One of MF, BP, CC. Defaults to "MF".
+        keys (set, optional): Relations between terms. Defaults to {"is_a", "part_of"}.
+        n_jobs (int, optional): Number of processes for the row blocks, negative values as in joblib. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: Similarity matrix, with sorted go_terms as index and columns
+    """
+    assert measure in IC_MEASURES | {"Wang"}, measure
+    assert measure == "Wang" or information_content is not None
+    go_terms = sorted(set(go_terms))
+    graph_ontology = __get_ontology_graph(graph_go, ont, keys)
+    go_terms_ontology = [go_id for go_id in go_terms if go_id in graph_ontology]
+    go_ids, weights = __get_ancestor_weights(
+        graph_ontology, go_terms_ontology, WANG_WEIGHTS
+    )
+    go_id_to_position = {go_id: i for i, go_id in enumerate(go_ids)}
+    rows = [go_id_to_position[go_id] for go_id in go_terms_ontology]
+    weights_terms = weights[rows]
+
+    if measure == "Wang":
+        row_blocks = __get_row_blocks(
+            len(rows), len(rows) * weights.itemsize * 2, n_jobs
+        )
+        ancestors = (weights_terms > 0).astype(weights_terms.dtype)
+        blocks = Parallel(n_jobs=n_jobs)(
+            delayed(__get_wang_block)(
+                weights_terms[row_block],
+                ancestors[row_block],
+                weights_terms,
+                ancestors,
+            )
+            for row_block in row_blocks
+        )
+        similarities = np.concatenate(blocks) if blocks else np.zeros((0, 0))
+        semantic_values = weights_terms.sum(axis=1)
+        similarities /= semantic_values[:, None] + semantic_values[None, :]
+        np.fill_diagonal(similarities, 1.0)
+    else:
+        ic = information_content.reindex(go_ids).to_numpy(dtype=float)
+        ic_order = np.argsort(-ic, kind="stable")
+        ancestors = np.packbits(weights_terms[:, ic_order] > 0, axis=1)
+        ancestors = np.pad(ancestors, ((0, 0), (0, -ancestors.shape[1] % 8)))
+        ancestors = np.ascontiguousarray(ancestors).view(np.uint64)
+        # the last element is for pairs without common ancestors
+        ic_sorted = np.append(ic[ic_order], np.nan)
+        row_blocks = __get_row_blocks(
+            len(rows), len(rows) * ancestors.shape[1] * 8, n_jobs
+        )
+        blocks = Parallel(n_jobs=n_jobs)(
+            delayed(__get_mica_block)(ancestors[row_block], ancestors, ic_sorted)
+            for row_block in row_blocks
+        )
+        mica = np.concatenate(blocks) if blocks else np.zeros((0, 0))
+        ic_terms = ic[rows]
+        ic1, ic2 = ic_terms[:, None], ic_terms[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            match measure:
+                case "Resnik":
+                    ic_finite = information_content[np.isfinite(information_content)]
+                    similarities = mica / ic_finite.max()
+                case "Lin":
+                    similarities = 2 * mica / (ic1 + ic2)
+                case "Jiang":
+                    similarities = 1 - np.minimum(1, ic1 + ic2 - 2 * mica)
+                case "Rel":
+                    similarities = 2 * mica / (ic1 + ic2) * (1 - np.exp(-mica))
+        similarities[~(np.isfinite(ic1) & np.isfinite(ic2))] = np.nan
+
+    df_similarities = pd.DataFrame(
+        similarities, index=go_terms_ontology, columns=go_terms_ontology
+    )
+    return df_similarities.reindex(index=go_terms, columns=go_terms)
+
+
+def get_semantic_similarities_native(
+    go_terms: list,
+    measure: str,
+    organism_ids: set = None,
+    ont: str = "MF",
+    datasets_path: str = "../data/datasets",
+    keys: set = {"is_a", "part_of"},
+    n_jobs: int = 1,
+    cache: SemanticSimilarityCache = None,
+) -> pd.DataFrame:
+    """Replacement for get_semantic_similarities that does not need R or an OrgDb package.
+    The IC is calculated from the go pickle, for the proteins of any set of organisms.
+
+    With a cache, the first call calculates the matrix for all terms with annotations (finite IC),
+    and later calls with the same GO release, annotations, measure and ontology read their terms from it.
+    Wang does not depend on the annotations, its matrix covers all terms of the sub-ontology.
+    For Wang, requests with terms outside of this universe are calculated without the cache.
+
+    Args:
+        go_terms (list): GO identifiers
+        measure (str): One of "Resnik", "Lin", "Rel", "Jiang", "Wang"
+        organism_ids (set, optional): Organisms for the IC, e.g. {559292} for yeast.
+            Defaults to None, which means all proteins in the go pickle.
+        ont (str, optional): One of MF, BP, CC. Defaults to "MF".
+        datasets_path (str, optional): location of the pickles from preprocessing. Defaults to "../data/datasets".
+        keys (set, optional): Relations between terms. Defaults to {"is_a", "part_of"}.
+        n_jobs (int, optional): Number of processes. Defaults to 1.
+        cache (SemanticSimilarityCache, optional): Persistent cache for the matrices. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Similarity matrix, with sorted go_terms as index and columns
+    """
+    graph_go = load_df("go_obo", folder_path=datasets_path)
+    information_content = None
+    if measure in IC_MEASURES:
+        proteins_subset = None
+        if organism_ids:
+            df_uniprot = load_df("uniprot", folder_path=datasets_path)
+            proteins_subset = set(
+                df_uniprot[df_uniprot.organism_id.isin(organism_ids)].index
+            )
+        information_content = get_information_content(
+            graph_go,
+            load_df("go", folder_path=datasets_path),
+            ont=ont,
+            proteins_subset=proteins_subset,
+            keys=keys,
+        )
+    if cache is not None:
+        cache_key = cache.get_key(graph_go, information_content, measure, ont, keys)
+        universe_terms = cache.get_terms(cache_key)
+        if universe_terms is None:
+            universe_terms = (
+                information_content.index[np.isfinite(information_content)]
+                if information_content is not None
+                else pd.Index(sorted(__get_ontology_graph(graph_go, ont, keys).nodes()))
+            )
+            df_universe = get_semantic_similarity_matrix(
+                universe_terms,
+                measure,
+                graph_go,
+                information_content=information_content,
+                ont=ont,
+                keys=keys,
+                n_jobs=n_jobs,
+            )
+            if not cache.put(cache_key, df_universe):
+                # larger than the cache, only used for this call
+                go_terms = sorted(set(go_terms))
+                return df_universe.reindex(index=go_terms, columns=go_terms)
+        if measure in IC_MEASURES or set(go_terms) <= set(universe_terms):
+            df_similarity = cache.get(cache_key, go_terms)
+            # None if another process evicted the matrix in the meantime
+            if df_similarity is not None:
+                return df_similarity
+    return get_semantic_similarity_matrix(
+        go_terms,
+        measure,
+        graph_go,
+        information_content=information_content,
+        ont=ont,
+        keys=keys,
+        n_jobs=n_jobs,
+    )
+
+
+def get_gosemsim_concordance(
+    go_terms: list,
+    measure: str,
+    organism: str = "yeast",
+    ont: str = "MF",
+    datasets_path: str = "../data/datasets",
+    **native_kwargs,
+) -> pd.Series:
+    """Compares get_semantic_similarities_native to the GOSemSim values from get_semantic_similarities.
+    Wang only depends on the ontology and should agree up to the GO release of go.db.
+    The IC measures also depend on the annotations, which come from the OrgDb in GOSemSim
+    and from the go pickle here.
+
+    Returns:
+        pd.Series: Number of compared pairs, correlations and differences of the similarities
+    """
+    df_gosemsim = get_semantic_similarities(
+        go_terms, measure=measure, organism=organism, ont=ont
+    )
+    df_native = get_semantic_similarities_native(
+        go_terms,
+        measure,
+        organism_ids={ORGANISM_IDS[organism]},
+        ont=ont,
+        datasets_path=datasets_path,
+        **native_kwargs,
+    )
+    df_native = df_native.loc[df_gosemsim.index, df_gosemsim.columns]
+    values_gosemsim = df_gosemsim.to_numpy(dtype=float).ravel()
+    values_native = df_native.to_numpy(dtype=float).ravel()
+    is_valid = ~np.isnan(values_gosemsim) & ~np.isnan(values_native)
+    differences = np.abs(values_gosemsim[is_valid] - values_native[is_valid])
+    values_gosemsim = pd.Series(values_gosemsim[is_valid])
+    values_native = pd.Series(values_native[is_valid])
+    return pd.Series(
+        [
+            len(values_gosemsim),
+            (np.isnan(df_gosemsim.to_numpy(dtype=float))).sum(),
+            (np.isnan(df_native.to_numpy(dtype=float))).sum(),
+            values_gosemsim.corr(values_native, method="pearson"),
+            values_gosemsim.corr(values_native, method="spearman"),
+            differences.mean(),
+            differences.max(),
+            (differences < 1e-3).mean(),
+        ],
+        index=[
+            "n_pairs",
+            "n_missing_gosemsim",
+            "n_missing_native",
+            "pearson",
+            "spearman",
+            "mean_absolute_difference",
+            "max_absolute_difference",
+            "fraction_equal",
+        ],
+    )
+
+
+def __empty_matrix(shape: tuple, path: str = None) -> np.array:
+    # float32 matrix in memory, or a memory map in a .npy file at path
+    if path is None:
+        return np.empty(shape, dtype=np.float32)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+
+
+def __get_best_matches(
+    similarities: np.array,
+    annotations: csr_matrix,
+    block_size: int,
+    best_matches: np.array,
+    is_valid: np.array = None,
+):
+    # Writes best_matches[t, p], the highest similarity of term t to any term of protein p, -inf if all are NaN.
+    # With is_valid, is_valid[t, p] is 1 for the finite best matches and 0 otherwise, where best_matches is 0.
+    # Only one block of proteins is calculated at a time, the outputs can be memory maps.
+    similarities = np.where(np.isnan(similarities), -np.inf, similarities)
+    for start in range(0, annotations.shape[0], block_size):
+        end = min(start + block_size, annotations.shape[0])
+        indptr = annotations.indptr[start : end + 1]
+        block = np.maximum.reduceat(
+            similarities[:, annotations.indices[indptr[0] : indptr[-1]]],
+            indptr[:-1] - indptr[0],
+            axis=1,
+        )
+        if is_valid is not None:
+            is_valid_block = np.isfinite(block)
+            block[~is_valid_block] = 0
+            is_valid[:, start:end] = is_valid_block
+        best_matches[:, start:end] = block
+
+
+def load_protein_similarities(output_file) -> pd.DataFrame:
+    """Opens a matrix written by get_protein_similarities(..., output_file=output_file) as a read-only memory map"""
+    with open(f"{output_file}.proteins.txt") as proteins_file:
+        proteins = proteins_file.read().split()
+    return pd.DataFrame(
+        np.load(output_file, mmap_mode="r"), index=proteins, columns=proteins, copy=False
+    )
+
+
+def get_protein_similarities(
+    df_go_similarity: pd.DataFrame,
+    df_uniprot_goa: pd.DataFrame,
+    combine: str = "BMA",
+    go_id_column: str = "go_id",
+    output_file=None,
+    block_size: int = 1024,
+) -> pd.DataFrame:
+    """Functional similarity of all pairs of proteins, from the similarities of their GO terms.
+    The combination methods are those of mgeneSim in GOSemSim:
+        BMA: best-match average, the mean of the best matches of the terms of both proteins in the other protein
+        rcmax: the higher of the two mean best matches
+        max: highest similarity of any pair of terms
+        avg: mean similarity of all pairs of terms
+    Only the terms in the index of df_go_similarity are used, and NaN similarities are ignored.
+    Proteins without any of these terms are left out.
+
+    The terms of each protein are a sparse matrix. The best match of every term in every protein is calculated
+    once with blocked max reductions, and the sums over the terms of the other protein are sparse matrix products.
+
+    Args:
+        df_go_similarity (pd.DataFrame): Square matrix of GO term similarities, from any source
+            (e.g. get_semantic_similarity_matrix or get_semantic_similarities)
+        df_uniprot_goa (pd.DataFrame): Annotations with columns Uniprot and go_id_column
+        combine (str, optional): One of "BMA", "rcmax", "max", "avg". Defaults to "BMA".
+        go_id_column (str, optional): "go_id" for direct annotations, as in GOSemSim,
+            or "go_id_ancestor" to include the ancestors. Defaults to "go_id".
+        output_file (optional): Path of a .npy file. If set, the result is written to a float32 memory map
+            with the proteins in {output_file}.proteins.txt, instead of being kept in memory.
+            The file can be opened again with load_protein_similarities. The intermediate matrices of all terms
+            and proteins are then also temporary memory maps in the same folder. Defaults to None.
+        block_size (int, optional): Number of proteins per block. Defaults to 1024.
+
+    Returns:
+        pd.DataFrame: Similarity matrix with sorted proteins as index and columns.
+            With output_file, the values are the memory map.
+    """
+    assert combine in {"BMA", "rcmax", "max", "avg"}, combine
+    go_ids = df_go_similarity.index
+    df_annotations = df_uniprot_goa[
+        df_uniprot_goa[go_id_column].isin(go_ids)
+    ].drop_duplicates(["Uniprot", go_id_column])
+    protein_codes, proteins = pd.factorize(df_annotations.Uniprot, sort=True)
+    term_codes = go_ids.get_indexer(df_annotations[go_id_column])
+    # csr with sorted indices, every protein has at least one term
+    annotations = csr_matrix(
+        (np.ones(len(protein_codes), dtype=np.float32), (protein_codes, term_codes)),
+        shape=(len(proteins), len(go_ids)),
+    )
+    annotations.sort_indices()
+    similarities = df_go_similarity.loc[go_ids, go_ids].to_numpy(dtype=np.float32)
+
+    protein_similarities = __empty_matrix((len(proteins), len(proteins)), output_file)
+    if output_file is not None:
+        with open(f"{output_file}.proteins.txt", "w") as proteins_file:
+            proteins_file.write("\n".join(proteins))
+    # With output_file, the matrices of all terms and proteins are temporary memory maps
+    # in the same folder, such that only the blocks are kept in memory.
+    with (
+        tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file)))
+        if output_file is not None
+        else nullcontext() as temporary_folder
+    ):
+        __fill_protein_similarities(
+            protein_similarities,
+            similarities,
+            annotations,
+            combine,
+            block_size,
+            temporary_folder,
+        )
+    if output_file is not None:
+        protein_similarities.flush()
+    return pd.DataFrame(
+        protein_similarities, index=proteins, columns=proteins, copy=False
+    )
+
+
+def __fill_protein_similarities(
+    protein_similarities: np.array,
+    similarities: np.array,
+    annotations: csr_matrix,
+    combine: str,
+    block_size: int,
+    temporary_folder: str = None,
+):
+    # see get_protein_similarities
+    def empty_term_matrix(name: str) -> np.array:
+        # terms x proteins
+        return __empty_matrix(
+            (similarities.shape[0], annotations.shape[0]),
+            f"{temporary_folder}/{name}.npy" if temporary_folder else None,
+        )
+
+    n_proteins = annotations.shape[0]
+    if combine in {"BMA", "rcmax"}:
+        best_matches = empty_term_matrix("best_matches")
+        is_valid = empty_term_matrix("is_valid")
+        __get_best_matches(similarities, annotations, block_size, best_matches, is_valid)
+        for start in range(0, n_proteins, block_size):
+            end = min(start + block_size, n_proteins)
+            # sums and counts of the best matches of the terms of proteins [start:end] in all proteins,
+            # and of the terms of all proteins in the proteins [start:end]
+            sums = annotations[start:end] @ best_matches
+            counts = annotations[start:end] @ is_valid
+            sums_reverse = (annotations @ best_matches[:, start:end]).T
+            counts_reverse = (annotations @ is_valid[:, start:end]).T
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if combine == "BMA":
+                    block = (sums + sums_reverse) / (counts + counts_reverse)
+                else:
+                    block = np.fmax(sums / counts, sums_reverse / counts_reverse)
+            protein_similarities[start:end] = block
+    elif combine == "max":
+        best_matches = empty_term_matrix("best_matches")
+        __get_best_matches(similarities, annotations, block_size, best_matches)
+        for start in range(0, n_proteins, block_size):
+            end = min(start + block_size, n_proteins)
+            indptr = annotations.indptr[start : end + 1]
+            block = np.maximum.reduceat(
+                best_matches[annotations.indices[indptr[0] : indptr[-1]]],
+                indptr[:-1] - indptr[0],
+                axis=0,
+            )
+            block[np.isinf(block)] = np.nan
+            protein_similarities[start:end] = block
+    else:
+        is_valid = (~np.isnan(similarities)).astype(np.float32)
+        similarities = np.nan_to_num(similarities, nan=0.0)
+        # sums and counts of the similarities of each term to all terms of each protein
+        term_sums = empty_term_matrix("term_sums")
+        term_counts = empty_term_matrix("term_counts")
+        for start in range(0, n_proteins, block_size):
+            end = min(start + block_size, n_proteins)
+            term_sums[:, start:end] = (annotations[start:end] @ similarities.T).T
+            term_counts[:, start:end] = (annotations[start:end] @ is_valid.T).T
+        for start in range(0, n_proteins, block_size):
+            end = min(start + block_size, n_proteins)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                protein_similarities[start:end] = (
+                    annotations[start:end] @ term_sums
+                ) / (annotations[start:end] @ term_counts)
+
+
 # # https://rpy2.github.io/doc/latest/html/introduction.html
 # # https://berkeley-scf.github.io/tutorial-parallelization/parallel-R.html
 
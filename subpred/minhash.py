@@ -0,0 +1,281 @@
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from joblib.parallel import delayed, Parallel, cpu_count
+from sklearn.metrics import adjusted_rand_score, adjusted_mutual_info_score
+from subpred.cdhit import cd_hit
+
+# Mersenne prime for universal hashing. k-mer codes are below 2**25 (k<=5) and the
+# coefficients below 2**31, so all products fit into uint64 without overflow.
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+MAX_HASH = MERSENNE_PRIME
+
+
+def __kmer_codes(sequence: str, k: int) -> np.array:
+    # 5 bits per character, the ascii codes of upper case letters are unique modulo 32
+    residues = np.frombuffer(sequence.encode("ascii"), dtype=np.uint8).astype(np.uint64)
+    residues = residues & np.uint64(31)
+    n_kmers = len(residues) - k + 1
+    if n_kmers < 1:
+        return np.array([], dtype=np.uint64)
+    codes = np.zeros(n_kmers, dtype=np.uint64)
+    for offset in range(k):
+        codes = (codes << np.uint64(5)) | residues[offset : offset + n_kmers]
+    return np.unique(codes)
+
+
+def __minhash_signatures_batch(
+    sequences: list, k: int, coefficients_a: np.array, coefficients_b: np.array
+) -> np.array:
+    signatures = np.full(
+        (len(sequences), len(coefficients_a)), MAX_HASH, dtype=np.uint64
+    )
+    for i, sequence in enumerate(sequences):
+        codes = __kmer_codes(sequence, k)
+        if len(codes) == 0:
+            continue
+        hashes = coefficients_a[:, None] * codes[None, :] + coefficients_b[:, None]
+        signatures[i] = (hashes % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+
+def get_minhash_signatures(
+    sequences: pd.Series,
+    k: int = 3,
+    n_permutations: int = 128,
+    random_seed: int = 1,
+    n_threads: int = 1,
+) -> np.array:
+    """MinHash signatures of the sets of amino acid k-mers in each sequence
+
+    Args:
+        sequences (pd.Series): Series with identifiers as index and sequences as values
+        k (int, optional): k-mer length, at most 5. Defaults to 3.
+        n_permutations (int, optional): Number of hash functions. Defaults to 128.
+        random_seed (int, optional): Seed for the hash function coefficients. Defaults to 1.
+        n_threads (int, optional): Number of processes, negative values as in joblib. Defaults to 1.
+
+    Returns:
+        np.array: uint64 array of shape (len(sequences), n_permutations)
+    """
+    assert 0 < k <= 5
+    assert n_threads != 0 and n_threads
+    random_generator = np.random.default_rng(seed=random_seed)
+    coefficients_a = random_generator.integers(
+        1, MERSENNE_PRIME, size=n_permutations, dtype=np.uint64
+    )
+    coefficients_b = random_generator.integers(
+        0, MERSENNE_PRIME, size=n_permutations, dtype=np.uint64
+    )
+    n_chunks = n_threads if n_threads > 0 else cpu_count() + n_threads + 1
+    sequences_chunks = np.array_split(sequences.values, indices_or_sections=n_chunks)
+    chunk_results = Parallel(n_jobs=n_threads)(
+        delayed(__minhash_signatures_batch)(
+            sequences_chunk.tolist(), k, coefficients_a, coefficients_b
+        )
+        for sequences_chunk in sequences_chunks
+    )
+    return np.concatenate(chunk_results)
+
+
+def __get_lsh_neighbors(signatures: np.array, n_bands: int) -> list:
+    # sequences that share at least one band of their signature become candidate pairs
+    n_sequences, n_permutations = signatures.shape
+    assert (
+        n_permutations % n_bands == 0
+    ), "n_permutations has to be a multiple of n_bands"
+    rows_per_band = n_permutations // n_bands
+    is_empty = (signatures == MAX_HASH).all(axis=1)
+    neighbors = [set() for _ in range(n_sequences)]
+    for band in range(n_bands):
+        buckets = defaultdict(list)
+        band_signatures = signatures[
+            :, band * rows_per_band : (band + 1) * rows_per_band
+        ]
+        for i in np.flatnonzero(~is_empty):
+            buckets[band_signatures[i].tobytes()].append(i)
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            for i in bucket:
+                neighbors[i].update(bucket)
+    for i in range(n_sequences):
+        neighbors[i].discard(i)
+    return neighbors
+
+
+def identity_to_jaccard(identity_threshold: int, k: int) -> float:
+    # A fraction p of identical residues leaves roughly p**k of the k-mers intact.
+    # The Jaccard index of two k-mer sets of the same size that share a fraction s is s/(2-s).
+    shared_kmers = (identity_threshold / 100.0) ** k
+    return shared_kmers / (2 - shared_kmers)
+
+
+def jaccard_to_identity(jaccard: np.array, k: int) -> np.array:
+    # inverse of identity_to_jaccard
+    shared_kmers = 2 * jaccard / (1 + jaccard)
+    return 100.0 * shared_kmers ** (1 / k)
+
+
+def minhash_clustering(
+    sequences: pd.Series,
+    identity_threshold: int,
+    verbose: bool = True,
+    k: int = 3,
+    n_permutations: int = 128,
+    n_bands: int = 32,
+    jaccard_threshold: float = None,
+    n_threads: int = 1,
+    random_seed: int = 1,
+    return_cluster_file: bool = False,
+):
+    """Approximate, in-process alternative to cd_hit for quick exploratory runs.
+
+    The sequence identity is estimated from MinHash sketches of the amino acid k-mers,
+    candidate pairs are found with LSH banding. Representatives are chosen greedily
+    in the order of cd-hit: Sequences are sorted by length (descending), and each sequence is
+    assigned to the first existing representative above the threshold, or becomes a new representative.
+
+    Args:
+        sequences (pd.Series): Series with identifiers as index and sequences as values
+        identity_threshold (int): Sequence identity threshold in percent, as in cd_hit
+        verbose (bool, optional): Print number of clusters. Defaults to True.
+        k (int, optional): k-mer length. Defaults to 3.
+        n_permutations (int, optional): Length of the MinHash signatures. Defaults to 128.
+        n_bands (int, optional): Number of LSH bands. More bands find more candidate pairs,
+            at a higher cost. Defaults to 32.
+        jaccard_threshold (float, optional): Minimum estimated Jaccard index of the k-mer sets.
+            Defaults to None, which derives it from identity_threshold with identity_to_jaccard.
+        n_threads (int, optional): Number of processes for the signatures. Defaults to 1.
+        random_seed (int, optional): Seed for the hash functions. Defaults to 1.
+        return_cluster_file (bool, optional): Return a cluster table with the same columns
+            as cd_hit(..., return_cluster_file=True) instead of the representatives.
+            The identity is an estimate. Defaults to False.
+
+    Returns:
+        list of representative identifiers, or pd.DataFrame with clusters
+    """
+    if jaccard_threshold is None:
+        jaccard_threshold = identity_to_jaccard(identity_threshold, k)
+    signatures = get_minhash_signatures(
+        sequences,
+        k=k,
+        n_permutations=n_permutations,
+        random_seed=random_seed,
+        n_threads=n_threads,
+    )
+    neighbors = __get_lsh_neighbors(signatures, n_bands=n_bands)
+    sequence_lengths = sequences.str.len().values
+
+    # stable sort: same order as cd-hit for sequences of the same length
+    order = np.argsort(-sequence_lengths, kind="stable")
+    cluster_ids = np.full(len(sequences), -1, dtype=np.int64)
+    identities = np.full(len(sequences), 100.0)
+    # position of each sequence in the sorted order, for finding the first representative
+    rank = np.empty(len(sequences), dtype=np.int64)
+    rank[order] = np.arange(len(sequences))
+    is_representative = np.zeros(len(sequences), dtype=bool)
+    n_clusters = 0
+    for i in order:
+        best_rank = len(sequences)
+        best_representative = -1
+        best_jaccard = 0.0
+        for j in neighbors[i]:
+            if not is_representative[j] or rank[j] >= best_rank:
+                continue
+            jaccard = (signatures[i] == signatures[j]).mean()
+            if jaccard >= jaccard_threshold:
+                best_rank = rank[j]
+                best_representative = j
+                best_jaccard = jaccard
+        if best_representative < 0:
+            is_representative[i] = True
+            cluster_ids[i] = n_clusters
+            n_clusters += 1
+        else:
+            cluster_ids[i] = cluster_ids[best_representative]
+            identities[i] = jaccard_to_identity(best_jaccard, k)
+
+    if verbose:
+        print(
+            f"minhash: clustered {len(sequences)} sequences into {n_clusters} clusters at threshold {identity_threshold}"
+        )
+
+    if return_cluster_file:
+        df_clusters = pd.DataFrame(
+            {
+                "cluster": cluster_ids,
+                "accession": sequences.index.values,
+                "identity_to_representative": np.round(identities, 2),
+                "n_amino_acids": sequence_lengths,
+                "is_representative": is_representative,
+            }
+        )
+        df_clusters = (
+            df_clusters.sort_values(
+                ["cluster", "is_representative"],
+                ascending=[True, False],
+                kind="stable",
+            )
+            .drop("is_representative", axis=1)
+            .reset_index(drop=True)
+        )
+        return df_clusters
+    return sequences.index[is_representative].tolist()
+
+
+def get_cdhit_concordance(
+    sequences: pd.Series,
+    identity_threshold: int,
+    cd_hit_kwargs: dict = None,
+    **minhash_kwargs,
+) -> pd.Series:
+    """Compares the clusters from minhash_clustering to those from cd_hit on the same sequences
+
+    Returns:
+        pd.Series: Cluster counts, overlap of the representatives, and agreement of the cluster assignments
+    """
+    df_clusters_cdhit = cd_hit(
+        sequences,
+        identity_threshold=identity_threshold,
+        verbose=False,
+        return_cluster_file=True,
+        **(cd_hit_kwargs if cd_hit_kwargs else dict()),
+    )
+    df_clusters_minhash = minhash_clustering(
+        sequences,
+        identity_threshold=identity_threshold,
+        verbose=False,
+        return_cluster_file=True,
+        **minhash_kwargs,
+    )
+    # the representative of a cd-hit cluster is its longest sequence
+    representatives_cdhit = set(
+        df_clusters_cdhit.sort_values("n_amino_acids", ascending=False, kind="stable")
+        .drop_duplicates("cluster")
+        .accession
+    )
+    representatives_minhash = set(
+        df_clusters_minhash.drop_duplicates("cluster").accession
+    )
+    labels_cdhit = df_clusters_cdhit.set_index("accession").cluster
+    labels_minhash = df_clusters_minhash.set_index("accession").cluster.loc[
+        labels_cdhit.index
+    ]
+    return pd.Series(
+        [
+            len(representatives_cdhit),
+            len(representatives_minhash),
+            len(representatives_cdhit & representatives_minhash)
+            / len(representatives_cdhit | representatives_minhash),
+            adjusted_rand_score(labels_cdhit.values, labels_minhash.values),
+            adjusted_mutual_info_score(labels_cdhit.values, labels_minhash.values),
+        ],
+        index=[
+            "n_clusters_cdhit",
+            "n_clusters_minhash",
+            "jaccard_representatives",
+            "adjusted_rand_index",
+            "adjusted_mutual_information",
+        ],
+    )
@@ -2,31 +2,22 @@ import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
+from subpred.go_protein_index import GoProteinIndex
 
 
-def get_go_overlap_matrix(df_uniprot_goa: pd.DataFrame, exclude_iea: bool):
-    df_uniprot_goa_overlap = df_uniprot_goa.copy(deep=True)
-    if exclude_iea:
-        df_uniprot_goa_overlap = df_uniprot_goa[df_uniprot_goa.evidence_code != "IEA"]
-    go_ids_unique = sorted(df_uniprot_goa_overlap.go_id_ancestor.unique())
-    go_to_proteins = (
-        df_uniprot_goa_overlap[["Uniprot", "go_id_ancestor"]]
-        .groupby("go_id_ancestor")
-        .apply(lambda x: set(x.Uniprot))
-        .to_dict()
-    )
-    records = list()
-    for go_id1 in go_ids_unique:
-        set1 = go_to_proteins[go_id1]
-        for go_id2 in go_ids_unique:
-            set2 = go_to_proteins[go_id2]
-            overlap = len(set1 & set2)
-            records.append([go_id1, go_id2, overlap])
-
-    df_go_overlaps = pd.DataFrame(records, columns=["go_id1", "go_id2", "overlap"])
-    df_go_overlaps = df_go_overlaps.pivot(
-        index="go_id1", columns="go_id2", values="overlap"
-    )
+def get_go_overlap_matrix(
+    df_uniprot_goa: pd.DataFrame,
+    exclude_iea: bool,
+    go_protein_index: GoProteinIndex = None,
+):
+    # go_protein_index: index that was built from df_uniprot_goa with the same value of exclude_iea
+    if go_protein_index is None:
+        go_protein_index = GoProteinIndex.from_annotations(
+            df_uniprot_goa, exclude_iea=exclude_iea
+        )
+    df_go_overlaps = go_protein_index.get_overlap_matrix()
+    df_go_overlaps.index.name = "go_id1"
+    df_go_overlaps.columns.name = "go_id2"
     return df_go_overlaps
 
 
@@ -0,0 +1,226 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+class SemanticSimilarityCache:
+    """Persistent cache of GO semantic similarity matrices, with one float32 .npy file per matrix.
+
+    Each matrix covers the whole term universe of its key, and is keyed by the GO release,
+    the annotation corpus, the measure, the sub-ontology and relations, and the TCSS cutoff.
+    Any subset of the terms is read by slicing a memory map of the file, so one matrix serves
+    all calls with the same key. The index file records the size and the last access of each matrix.
+    When the total size exceeds max_size_bytes, the least recently used matrices are deleted.
+    Changes of the index are serialized with a lock file, such that several processes can share the cache.
+
+    Example:
+        cache = SemanticSimilarityCache("../data/cache/semantic_similarity")
+        get_semantic_similarities_native(go_terms, "Lin", organism_ids={559292}, cache=cache)
+    """
+
+    # the last access of a matrix is only written to the index if the previous one is older than this (seconds)
+    access_time_resolution = 3600
+    # temporary files of crashed processes are deleted after this time (seconds), even if the pid was reused
+    max_tmp_file_age = 24 * 3600
+
+    def __init__(self, cache_folder, max_size_bytes: int = 4 * 2**30):
+        self.cache_folder = Path(cache_folder)
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.index_file = self.cache_folder / "index.json"
+        self.lock_file = self.cache_folder / "index.lock"
+
+    @staticmethod
+    def get_key(
+        graph_go,
+        information_content: pd.Series,
+        measure: str,
+        ont: str,
+        keys: set,
+        tcss_cutoff=None,
+    ) -> str:
+        """Hash of everything a similarity matrix depends on.
+        The GO release is the data-version in the header of the obo file, or a hash of the edges if it is missing.
+        The annotation corpus enters the similarities only through the IC, so the IC values are hashed.
+        information_content is None for measures that only depend on the ontology (Wang).
+        """
+        go_release = graph_go.graph.get("data-version")
+        if not go_release:
+            go_release = hashlib.sha1(
+                str(sorted(graph_go.edges(keys=True))).encode()
+            ).hexdigest()
+        annotation_hash = None
+        if information_content is not None:
+            annotation_hash = hashlib.sha1(
+                pd.util.hash_pandas_object(information_content).to_numpy().tobytes()
+            ).hexdigest()
+        key = [go_release, annotation_hash, measure, ont, sorted(keys), tcss_cutoff]
+        return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+    def __read_index(self) -> dict:
+        if not self.index_file.is_file():
+            return dict()
+        with open(self.index_file) as index_file:
+            return json.load(index_file)
+
+    def __write_index(self, index: dict):
+        # only while holding __lock_index.
+        # replace instead of overwriting, so that readers without the lock never read a partial file
+        tmp_file = self.index_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(tmp_file, self.index_file)
+
+    @contextmanager
+    def __lock_index(self):
+        # exclusive lock for reading, changing and writing the index, and for adding and deleting matrices
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __get_files(self, cache_key: str):
+        return (
+            self.cache_folder / f"{cache_key}.npy",
+            self.cache_folder / f"{cache_key}.terms.txt",
+        )
+
+    def get_terms(self, cache_key: str) -> pd.Index:
+        """Term universe of a cached matrix, None if the key is not cached"""
+        if cache_key not in self.__read_index():
+            return None
+        _, terms_file = self.__get_files(cache_key)
+        try:
+            with open(terms_file) as terms:
+                return pd.Index(terms.read().split())
+        except FileNotFoundError:
+            # evicted by another process after reading the index
+            return None
+
+    def get(self, cache_key: str, go_terms: list) -> pd.DataFrame:
+        """Similarities of the sorted go_terms, from the matrix of cache_key.
+        Terms outside of the term universe are NaN. Returns None if the key is not cached.
+        """
+        universe_terms = self.get_terms(cache_key)
+        if universe_terms is None:
+            return None
+        matrix_file, _ = self.__get_files(cache_key)
+        go_terms = sorted(set(go_terms))
+        positions = universe_terms.get_indexer(go_terms)
+        found = positions >= 0
+        similarities = np.full((len(go_terms), len(go_terms)), np.nan, np.float32)
+        try:
+            matrix = np.load(matrix_file, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        # reading the rows in file order, then selecting the columns in memory
+        similarities[np.ix_(found, found)] = matrix[positions[found]][
+            :, positions[found]
+        ]
+        entry = self.__read_index().get(cache_key)
+        if entry and time.time() - entry["last_access"] > self.access_time_resolution:
+            with self.__lock_index():
+                index = self.__read_index()
+                if cache_key in index:
+                    index[cache_key]["last_access"] = time.time()
+                    self.__write_index(index)
+        return pd.DataFrame(similarities, index=go_terms, columns=go_terms)
+
+    def put(self, cache_key: str, df_similarity: pd.DataFrame) -> bool:
+        """Stores the matrix of a term universe, evicting the least recently used matrices if necessary.
+        Returns False if the matrix alone is larger than max_size_bytes, and is not stored.
+        """
+        size = df_similarity.shape[0] * df_similarity.shape[1] * 4
+        if size > self.max_size_bytes:
+            return False
+        # written under temporary names without the lock, and renamed with the lock
+        files = self.__get_files(cache_key)
+        tmp_matrix_file, tmp_terms_file = [
+            file.with_name(f"{file.name}.{os.getpid()}.tmp") for file in files
+        ]
+        matrix = np.lib.format.open_memmap(
+            tmp_matrix_file, mode="w+", dtype=np.float32, shape=df_similarity.shape
+        )
+        matrix[:] = df_similarity.to_numpy(dtype=np.float32)
+        matrix.flush()
+        del matrix
+        with open(tmp_terms_file, "w") as terms:
+            terms.write("\n".join(df_similarity.index))
+        with self.__lock_index():
+            self.__evict(self.max_size_bytes - size, keep=cache_key)
+            for tmp_file, file in zip([tmp_matrix_file, tmp_terms_file], files):
+                os.replace(tmp_file, file)
+            index = self.__read_index()
+            index[cache_key] = dict(
+                size=os.path.getsize(files[0]), last_access=time.time()
+            )
+            self.__write_index(index)
+        return True
+
+    def __evict(self, max_size_bytes: int, keep: str = None):
+        # only while holding __lock_index.
+        # deletes least recently used matrices until the others fit into max_size_bytes.
+        # Matrices that are not in the index (e.g. after a crash before the index was written) are always deleted.
+        self.__delete_abandoned_tmp_files()
+        index = self.__read_index()
+        for matrix_file in self.cache_folder.glob("*.npy"):
+            if matrix_file.stem not in index:
+                for file in self.__get_files(matrix_file.stem):
+                    file.unlink(missing_ok=True)
+        total_size = sum(entry["size"] for entry in index.values())
+        for cache_key, entry in sorted(
+            index.items(), key=lambda item: item[1]["last_access"]
+        ):
+            if total_size <= max_size_bytes:
+                break
+            if cache_key == keep:
+                continue
+            for file in self.__get_files(cache_key):
+                file.unlink(missing_ok=True)
+            total_size -= entry["size"]
+            del index[cache_key]
+        self.__write_index(index)
+
+    def __delete_abandoned_tmp_files(self):
+        # only while holding __lock_index.
+        # Temporary files of put and __write_index are named *.{pid}.tmp. They are left behind when the process
+        # is killed, and are not counted in the index. Deleted if the process is gone or if they are very old.
+        for tmp_file in self.cache_folder.glob("*.tmp"):
+            pid = tmp_file.suffixes[-2][1:] if len(tmp_file.suffixes) >= 2 else ""
+            try:
+                is_abandoned = (
+                    not pid.isdigit()
+                    or not self.__is_process_alive(int(pid))
+                    or time.time() - tmp_file.stat().st_mtime > self.max_tmp_file_age
+                )
+            except FileNotFoundError:
+                # renamed by its process in the meantime
+                continue
+            if is_abandoned:
+                tmp_file.unlink(missing_ok=True)
+
+    @staticmethod
+    def __is_process_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # process of another user
+            return True
+        return True
+
+    def get_size(self) -> int:
+        return sum(entry["size"] for entry in self.__read_index().values())
+
+    def clear(self):
+        with self.__lock_index():
+            self.__evict(0)
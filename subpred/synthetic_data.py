@@ -0,0 +1,618 @@
+import os
+import shutil
+import stat
+import numpy as np
+import pandas as pd
+import networkx as nx
+from subpred.util import save_df
+from subpred.pssm import PSSM_AA_ORDER
+
+# Synthetic versions of the pickles from notebooks/01_preprocessing.ipynb, for benchmarking without downloads.
+# Terms and proteins are random, but the schemas, dtypes and the terms that the pipeline looks up by name
+# (e.g. "transmembrane transporter activity") are the same as in the real datasets.
+
+# background frequencies of the amino acids in UniProtKB, in the order of PSSM_AA_ORDER
+AMINO_ACID_FREQUENCIES = np.array(
+    [8.25, 5.53, 4.06, 5.45, 1.37, 3.93, 6.75, 7.07, 2.27, 5.96]
+    + [9.66, 5.84, 2.42, 3.86, 4.70, 6.56, 5.34, 1.08, 2.92, 6.87]
+)
+AMINO_ACID_FREQUENCIES = AMINO_ACID_FREQUENCIES / AMINO_ACID_FREQUENCIES.sum()
+AMINO_ACID_BYTES = np.frombuffer(PSSM_AA_ORDER.encode("ascii"), dtype=np.uint8)
+# datasets that are written by create_synthetic_datasets
+SYNTHETIC_DATASET_NAMES = ["uniprot", "go", "go_chebi", "go_obo", "chebi_obo"]
+# real organisms first (yeast, human, E. coli, A. thaliana, mouse), then synthetic ones
+ORGANISM_IDS = [559292, 9606, 83333, 3702, 10090]
+# fractions of the GO terms in each namespace, approximately as in GO
+NAMESPACE_FRACTIONS = {
+    "biological_process": 0.65,
+    "molecular_function": 0.26,
+    "cellular_component": 0.09,
+}
+NAMESPACE_TO_ASPECT = {
+    "biological_process": "P",
+    "molecular_function": "F",
+    "cellular_component": "C",
+}
+# terms that are referenced by identifier or name in subpred, with their namespace and parent
+FIXED_GO_TERMS = {
+    "GO:0008150": ("biological_process", "biological_process", None),
+    "GO:0003674": ("molecular_function", "molecular_function", None),
+    "GO:0005575": ("cellular_component", "cellular_component", None),
+    "GO:0005215": ("transporter activity", "molecular_function", "GO:0003674"),
+    "GO:0022857": (
+        "transmembrane transporter activity",
+        "molecular_function",
+        "GO:0005215",
+    ),
+    "GO:0110165": (
+        "cellular anatomical entity",
+        "cellular_component",
+        "GO:0005575",
+    ),
+}
+GO_ROOT_TRANSPORTERS = "GO:0022857"
+# defaults of subset_pipeline: every transporter term with MIN_SAMPLES_PER_TERM proteins needs another such term,
+# such that both have MIN_UNIQUE_SAMPLES_PER_TERM proteins that the other term does not have
+MIN_SAMPLES_PER_TERM = 20
+MIN_UNIQUE_SAMPLES_PER_TERM = 5
+CHEBI_ROOT = "CHEBI:24431"
+QUALIFIERS = {
+    "F": (["enables", "contributes_to", "NOT|enables"], [0.94, 0.05, 0.01]),
+    "P": (["involved_in", "acts_upstream_of", "NOT|involved_in"], [0.9, 0.09, 0.01]),
+    "C": (["located_in", "is_active_in", "part_of", "NOT|located_in"], [0.7, 0.15, 0.14, 0.01]),
+}
+EVIDENCE_CODES = (
+    ["IEA", "IBA", "ISS", "IDA", "IMP", "IPI", "TAS", "HDA", "ISO", "NAS"],
+    [0.62, 0.12, 0.06, 0.07, 0.04, 0.03, 0.02, 0.02, 0.01, 0.01],
+)
+GO_CHEBI_RELATIONS = (
+    ["has_primary_input", "has_participant", "has_primary_input_or_output"],
+    [0.6, 0.3, 0.1],
+)
+# fragments of synthetic SMILES strings, any concatenation of them is valid
+SMILES_FRAGMENTS = ["C", "CC", "O", "N", "C(=O)O", "c1ccccc1", "CN", "CO", "C(C)C", "S"]
+# folders of calculate_features that contain the PSSM files
+PSSM_FOLDER_NAMES = ["pssm_uniref50_1it", "pssm_uniref50_3it", "pssm_uniref90_3it"]
+PSSM_HEADER = (
+    "\nLast position-specific scoring matrix computed, weighted observed percentages rounded down,"
+    " information per position, and relative weight of gapless real matches to pseudocounts\n"
+    + "         "
+    + "".join(f"{amino_acid:>4}" for amino_acid in PSSM_AA_ORDER * 2)
+    + "\n"
+)
+PSSM_ROW_FORMAT = "%5d %s   " + "%3d" * 20 + " " + "%4d" * 20 + "  0.50 0.00"
+PSSM_FOOTER = (
+    "\n                      K         Lambda\n"
+    "Standard Ungapped    0.1340     0.3158\n"
+    "Standard Gapped      0.0410     0.2670\n"
+    "PSI Ungapped         0.1354     0.3162\n"
+    "PSI Gapped           0.0411     0.2670\n"
+)
+# Stand-in for the cd-hit executable, with the same arguments and output files.
+# The synthetic families only contain substitutions, so sequences of the same length are compared
+# position by position. Sequences are processed by decreasing length, as in cd-hit.
+CD_HIT_STUB = '''#!/usr/bin/env python3
+import sys
+from collections import defaultdict
+import numpy as np
+
+arguments = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+threshold = float(arguments["-c"])
+records = list()
+with open(arguments["-i"]) as fasta_file:
+    for line in fasta_file:
+        if line.startswith(">"):
+            records.append([line[1:].split()[0], ""])
+        else:
+            records[-1][1] += line.strip()
+records.sort(key=lambda record: -len(record[1]))
+representatives = defaultdict(list)
+clusters = list()
+for accession, sequence in records:
+    residues = np.frombuffer(sequence.encode(), dtype=np.uint8)
+    candidates = representatives[len(sequence)]
+    identities = [(residues == other).mean() for other, _ in candidates]
+    best = int(np.argmax(identities)) if identities else -1
+    if best >= 0 and identities[best] >= threshold:
+        clusters[candidates[best][1]].append((accession, len(sequence), identities[best]))
+    else:
+        candidates.append((residues, len(clusters)))
+        clusters.append([(accession, len(sequence), None)])
+
+with open(arguments["-o"], "w") as fasta_out, open(arguments["-o"] + ".clstr", "w") as clstr_file:
+    sequences = dict(records)
+    for cluster_id, members in enumerate(clusters):
+        fasta_out.write(f">{members[0][0]}\\n{sequences[members[0][0]]}\\n")
+        clstr_file.write(f">Cluster {cluster_id}\\n")
+        for position, (accession, length, identity) in enumerate(members):
+            suffix = "*" if identity is None else f"at {100 * identity:.2f}%"
+            clstr_file.write(f"{position}\\t{length}aa, >{accession}... {suffix}\\n")
+print(f"  {len(records)}  finished  {len(clusters)}  clusters")
+'''
+
+
+def __get_accessions(n_proteins: int) -> list:
+    # [OPQ][0-9][A-Z0-9]{3}[0-9], matches UNIPROT_ACCESSION_PATTERN of cdhit.py for up to 14M proteins
+    alphanumeric = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    assert n_proteins <= 3 * 10 * 36**3 * 10
+    accessions = list()
+    for i in range(n_proteins):
+        i, first = divmod(i, 3)
+        i, last = divmod(i, 10)
+        i, digit = divmod(i, 10)
+        i, c1 = divmod(i, 36)
+        c3, c2 = divmod(i, 36)
+        accessions.append(
+            f"{'OPQ'[first]}{digit}{alphanumeric[c1]}{alphanumeric[c2]}{alphanumeric[c3]}{last}"
+        )
+    return accessions
+
+
+def __get_popularity(n: int, rng, exponent: float = 1.0) -> np.array:
+    # Zipf-like probabilities in a random order, for skewed annotation counts
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def __add_random_dag(graph, root: str, node_ids: list, rng, extra_parents: dict):
+    # Random recursive tree below root: every node gets an is_a parent chosen uniformly among the earlier nodes,
+    # which gives logarithmic depths as in GO. extra_parents: relation -> probability of an additional
+    # parent of that type among the earlier nodes. Edges always point to earlier nodes, so there are no cycles.
+    earlier = [root]
+    for node_id in node_ids:
+        graph.add_edge(node_id, earlier[rng.integers(len(earlier))], key="is_a")
+        for relation, probability in extra_parents.items():
+            if len(earlier) > 1 and rng.random() < probability:
+                parent = earlier[rng.integers(len(earlier))]
+                if not graph.has_edge(node_id, parent):
+                    graph.add_edge(node_id, parent, key=relation)
+        earlier.append(node_id)
+
+
+def __get_go_graph(n_go_terms: int, rng, data_version: str):
+    graph_go = nx.MultiDiGraph()
+    graph_go.graph.update({"format-version": "1.2", "data-version": data_version, "ontology": "go"})
+    for go_id, (name, namespace, parent) in FIXED_GO_TERMS.items():
+        graph_go.add_node(go_id, name=name, namespace=namespace)
+        if parent:
+            graph_go.add_edge(go_id, parent, key="is_a")
+    next_id = 2000000
+    # subtrees: (root, namespace, fraction of the terms)
+    subtrees = [
+        ("GO:0008150", "biological_process", NAMESPACE_FRACTIONS["biological_process"]),
+        ("GO:0003674", "molecular_function", NAMESPACE_FRACTIONS["molecular_function"] * 0.8),
+        (GO_ROOT_TRANSPORTERS, "molecular_function", NAMESPACE_FRACTIONS["molecular_function"] * 0.2),
+        ("GO:0005575", "cellular_component", NAMESPACE_FRACTIONS["cellular_component"] * 0.2),
+        ("GO:0110165", "cellular_component", NAMESPACE_FRACTIONS["cellular_component"] * 0.8),
+    ]
+    for root, namespace, fraction in subtrees:
+        n_terms = max(1, int(fraction * (n_go_terms - len(FIXED_GO_TERMS))))
+        node_ids = [f"GO:{next_id + i:07d}" for i in range(n_terms)]
+        next_id += n_terms
+        for node_id in node_ids:
+            graph_go.add_node(
+                node_id,
+                name=f"synthetic {namespace.replace('_', ' ')} {node_id[3:]}",
+                namespace=namespace,
+            )
+            if rng.random() < 0.02:
+                graph_go.nodes[node_id]["alt_id"] = [f"GO:{next_id:07d}"]
+                next_id += 1
+        __add_random_dag(
+            graph_go,
+            root,
+            node_ids,
+            rng,
+            extra_parents={"is_a": 0.25}
+            if namespace == "molecular_function"
+            else {"is_a": 0.2, "part_of": 0.15},
+        )
+    return graph_go
+
+
+def __get_chebi_graph(n_chebi_terms: int, rng):
+    graph_chebi = nx.MultiDiGraph()
+    graph_chebi.graph.update({"format-version": "1.2", "data-version": "synthetic", "ontology": "chebi"})
+    graph_chebi.add_node(CHEBI_ROOT, name="chemical entity", subset=["3_STAR"])
+    node_ids = [f"CHEBI:{100000 + i}" for i in range(n_chebi_terms - 1)]
+    for node_id in node_ids:
+        smiles = "".join(
+            rng.choice(SMILES_FRAGMENTS, size=rng.integers(1, 8)).tolist()
+        )
+        graph_chebi.add_node(
+            node_id,
+            name=f"synthetic chemical entity {node_id[6:]}",
+            subset=["3_STAR"] if rng.random() < 0.6 else ["2_STAR"],
+            property_value=[
+                f'http://purl.obolibrary.org/obo/chebi/smiles "{smiles}" xsd:string',
+                f'http://purl.obolibrary.org/obo/chebi/charge "{rng.integers(-2, 3)}" xsd:string',
+            ],
+        )
+        if rng.random() < 0.02:
+            graph_chebi.nodes[node_id]["alt_id"] = [f"CHEBI:{900000 + len(graph_chebi)}"]
+    __add_random_dag(
+        graph_chebi,
+        CHEBI_ROOT,
+        node_ids,
+        rng,
+        extra_parents={"is_a": 0.2, "has_role": 0.1, "has_functional_parent": 0.05},
+    )
+    return graph_chebi
+
+
+def __get_sequences(
+    families: np.array, family_lengths: np.array, rng, chunk_size: int = 20000
+) -> list:
+    # Each family has an ancestor sequence, members are copies with 0-60% substituted residues
+    family_offsets = np.concatenate([[0], np.cumsum(family_lengths)[:-1]])
+    ancestors = rng.choice(20, size=family_lengths.sum(), p=AMINO_ACID_FREQUENCIES).astype(np.uint8)
+    sequences = list()
+    for start in range(0, len(families), chunk_size):
+        families_chunk = families[start : start + chunk_size]
+        lengths = family_lengths[families_chunk]
+        protein_offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(family_offsets[families_chunk] - protein_offsets, lengths)
+        positions += np.arange(lengths.sum())
+        residues = ancestors[positions]
+        substitution_rates = np.repeat(rng.uniform(0.0, 0.6, len(families_chunk)), lengths)
+        is_substituted = rng.random(len(residues)) < substitution_rates
+        residues[is_substituted] = rng.choice(
+            20, size=is_substituted.sum(), p=AMINO_ACID_FREQUENCIES
+        )
+        sequences_bytes = AMINO_ACID_BYTES[residues].tobytes()
+        sequences.extend(
+            sequences_bytes[offset : offset + length].decode()
+            for offset, length in zip(protein_offsets, lengths)
+        )
+    return sequences
+
+
+def __get_go_annotations(
+    graph_go, families: np.array, n_families: int, accessions: list, transporter_fraction: float, rng
+) -> pd.DataFrame:
+    # Families share most of their annotations. Terms are drawn with skewed popularity per namespace,
+    # and a fraction of the families gets a term below "transmembrane transporter activity".
+    # nx.ancestors follows the edges from child to parent, these are the terms below the root
+    transporter_terms = sorted(nx.ancestors(graph_go, GO_ROOT_TRANSPORTERS))
+    excluded_terms = set(transporter_terms) | FIXED_GO_TERMS.keys()
+    family_codes = list()
+    term_ids = list()
+    # mean number of terms per family in each namespace
+    terms_per_family = {"biological_process": 3.0, "molecular_function": 1.5, "cellular_component": 1.5}
+    for namespace, mean_terms in terms_per_family.items():
+        namespace_terms = sorted(
+            go_id
+            for go_id, node_namespace in graph_go.nodes(data="namespace")
+            if node_namespace == namespace and go_id not in excluded_terms
+        )
+        n_terms = 1 + rng.poisson(mean_terms, n_families)
+        family_codes.append(np.repeat(np.arange(n_families), n_terms))
+        term_ids.append(
+            np.array(namespace_terms, dtype=object)[
+                rng.choice(len(namespace_terms), size=n_terms.sum(), p=__get_popularity(len(namespace_terms), rng))
+            ]
+        )
+    transporter_families = np.flatnonzero(rng.random(n_families) < transporter_fraction)
+    family_codes.append(transporter_families)
+    term_ids.append(
+        np.array(transporter_terms, dtype=object)[
+            rng.choice(
+                len(transporter_terms),
+                size=len(transporter_families),
+                p=__get_popularity(len(transporter_terms), rng),
+            )
+        ]
+    )
+    df_family_terms = pd.DataFrame(
+        {"family": np.concatenate(family_codes), "go_id": np.concatenate(term_ids)}
+    )
+    df_proteins = pd.DataFrame({"Uniprot": accessions, "family": families})
+    df_annotations = df_proteins.merge(df_family_terms, on="family").drop("family", axis=1)
+    # proteins lose some of the family terms
+    df_annotations = df_annotations[rng.random(len(df_annotations)) < 0.8]
+    df_annotations["aspect"] = df_annotations.go_id.map(
+        {go_id: NAMESPACE_TO_ASPECT[namespace] for go_id, namespace in graph_go.nodes(data="namespace")}
+    )
+    df_annotations["qualifier"] = ""
+    for aspect, (qualifiers, probabilities) in QUALIFIERS.items():
+        is_aspect = df_annotations.aspect == aspect
+        df_annotations.loc[is_aspect, "qualifier"] = rng.choice(
+            qualifiers, size=is_aspect.sum(), p=probabilities
+        )
+    df_annotations["evidence_code"] = rng.choice(
+        EVIDENCE_CODES[0], size=len(df_annotations), p=EVIDENCE_CODES[1]
+    )
+    df_annotations = df_annotations[["Uniprot", "qualifier", "go_id", "evidence_code", "aspect"]]
+    return (
+        df_annotations.drop_duplicates()
+        .astype(
+            {
+                "Uniprot": "string",
+                "qualifier": "category",
+                "go_id": "string",
+                "evidence_code": "category",
+                "aspect": "category",
+            }
+        )
+        .reset_index(drop=True)
+    )
+
+
+def __get_unpaired_transporter_terms(graph_go, df_uniprot: pd.DataFrame, df_go: pd.DataFrame) -> set:
+    # Terms below the transporter root that subset_pipeline cannot evaluate with any other term, in the datasets
+    # of get_transmembrane_transporter_dataset with max_sequence_evidence_code 1 or 2.
+    # In the random DAG, some terms near the root are ancestors of almost all transporters,
+    # and the terms of a single large family can form a chain with the same proteins.
+    transporter_terms = nx.ancestors(graph_go, GO_ROOT_TRANSPORTERS)
+    df_go = df_go[df_go.go_id.isin(transporter_terms) & (df_go.qualifier == "enables")]
+    # the transporter terms above each term, including itself
+    go_id_to_ancestors = {
+        go_id: [go_id] + sorted(nx.descendants(graph_go, go_id) & transporter_terms)
+        for go_id in df_go.go_id.unique()
+    }
+    unpaired_terms = set()
+    for max_sequence_evidence_code in [1, 2]:
+        proteins = df_uniprot.index[
+            df_uniprot.gene_names.notnull()
+            & (df_uniprot.protein_existence <= max_sequence_evidence_code)
+        ]
+        df_go_view = df_go[df_go.Uniprot.isin(proteins)]
+        go_id_to_proteins = (
+            df_go_view.assign(go_id=df_go_view.go_id.map(go_id_to_ancestors))
+            .explode("go_id")
+            .groupby("go_id")
+            .Uniprot.agg(set)
+        )
+        go_id_to_proteins = go_id_to_proteins[
+            go_id_to_proteins.apply(len) >= MIN_SAMPLES_PER_TERM
+        ].to_dict()
+        for go_id, go_id_proteins in go_id_to_proteins.items():
+            if not any(
+                len(go_id_proteins - other_proteins) >= MIN_UNIQUE_SAMPLES_PER_TERM
+                and len(other_proteins - go_id_proteins) >= MIN_UNIQUE_SAMPLES_PER_TERM
+                for other_go_id, other_proteins in go_id_to_proteins.items()
+                if other_go_id != go_id
+            ):
+                unpaired_terms.add(go_id)
+    return unpaired_terms
+
+
+def __remove_go_terms(graph_go, df_go: pd.DataFrame, go_ids: set) -> pd.DataFrame:
+    # Removes terms below the transporter root (only is_a relations) from graph_go, their children get their
+    # parents instead. Their annotations move to all parents, so the proteins of all other terms stay the same.
+    for go_id in sorted(go_ids):
+        parents = sorted(graph_go.successors(go_id))
+        for child in set(graph_go.predecessors(go_id)):
+            for parent in parents:
+                if not graph_go.has_edge(child, parent):
+                    graph_go.add_edge(child, parent, key="is_a")
+        graph_go.remove_node(go_id)
+        df_go = df_go.assign(
+            go_id=df_go.go_id.apply(lambda annotated_go_id: parents if annotated_go_id == go_id else annotated_go_id)
+        ).explode("go_id")
+    # proteins that had the removed term and one of its parents
+    return df_go.drop_duplicates().reset_index(drop=True)
+
+
+def __get_go_chebi(graph_go, graph_chebi, rng) -> pd.DataFrame:
+    # transporter terms and a third of the process terms have one or two molecules
+    transporter_terms = nx.ancestors(graph_go, GO_ROOT_TRANSPORTERS)
+    go_ids = sorted(
+        go_id
+        for go_id, namespace in graph_go.nodes(data="namespace")
+        if go_id in transporter_terms or (namespace == "biological_process" and rng.random() < 0.3)
+    )
+    chebi_ids = np.array(sorted(graph_chebi.nodes()), dtype=object)
+    n_molecules = rng.integers(1, 3, len(go_ids))
+    df_go_chebi = pd.DataFrame(
+        {
+            "go_id": np.repeat(go_ids, n_molecules),
+            "chebi_id": chebi_ids[
+                rng.choice(len(chebi_ids), size=n_molecules.sum(), p=__get_popularity(len(chebi_ids), rng))
+            ],
+            "relation": rng.choice(GO_CHEBI_RELATIONS[0], size=n_molecules.sum(), p=GO_CHEBI_RELATIONS[1]),
+        }
+    )
+    df_go_chebi.insert(2, "chebi_term", df_go_chebi.chebi_id.map(dict(graph_chebi.nodes(data="name"))))
+    return (
+        df_go_chebi.drop_duplicates(["go_id", "chebi_id", "relation"])
+        .astype({"relation": "category"})
+        .reset_index(drop=True)
+    )
+
+
+def write_stub_pssm_files(sequences: pd.Series, pssm_folder_path: str, random_seed: int = 1):
+    """Writes files in the format of psiblast -out_ascii_pssm, so that calculate_pssm_feature
+    finds them and does not call psiblast. The scores are random, with high values for the residue itself.
+
+    Args:
+        sequences (pd.Series): Series with accessions as index and sequences as values
+        pssm_folder_path (str): tmp_folder of calculate_pssm_feature
+        random_seed (int, optional): Defaults to 1.
+    """
+    rng = np.random.default_rng(random_seed)
+    os.makedirs(pssm_folder_path, exist_ok=True)
+    amino_acid_to_position = {amino_acid: i for i, amino_acid in enumerate(PSSM_AA_ORDER)}
+    for accession, sequence in sequences.items():
+        residues = np.array([amino_acid_to_position[amino_acid] for amino_acid in sequence])
+        scores = rng.integers(-4, 3, size=(len(sequence), 20))
+        scores[np.arange(len(sequence)), residues] = rng.integers(4, 10, size=len(sequence))
+        percentages = rng.integers(0, 30, size=(len(sequence), 20))
+        rows = np.column_stack([np.arange(1, len(sequence) + 1), scores, percentages]).tolist()
+        lines = [
+            PSSM_ROW_FORMAT % (row[0], amino_acid, *row[1:])
+            for amino_acid, row in zip(sequence, rows)
+        ]
+        with open(f"{pssm_folder_path}/{accession}.pssm", "w") as pssm_file:
+            pssm_file.write(PSSM_HEADER + "\n".join(lines) + "\n" + PSSM_FOOTER)
+
+
+def write_stub_cd_hit(folder_path: str) -> str:
+    """Writes a stand-in for the cd-hit executable, for cd_hit(..., executable_location=...).
+    Returns the path of the executable.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    executable_path = os.path.join(folder_path, "cd-hit")
+    with open(executable_path, "w") as executable_file:
+        executable_file.write(CD_HIT_STUB)
+    os.chmod(executable_path, os.stat(executable_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return executable_path
+
+
+def __get_existing_files(folder_path: str, pssm_folder_path: str, cd_hit_folder_path: str) -> list:
+    # files that create_synthetic_datasets would replace, load_df finds datasets with any file extension
+    existing_files = list()
+    if os.path.isdir(folder_path):
+        existing_files += [
+            os.path.join(folder_path, file_name)
+            for file_name in sorted(os.listdir(folder_path))
+            if os.path.splitext(file_name)[0] in SYNTHETIC_DATASET_NAMES
+        ]
+    if pssm_folder_path:
+        for pssm_folder_name in PSSM_FOLDER_NAMES:
+            pssm_folder = f"{pssm_folder_path}/{pssm_folder_name}"
+            if os.path.isdir(pssm_folder):
+                existing_files += [
+                    os.path.join(pssm_folder, file_name)
+                    for file_name in sorted(os.listdir(pssm_folder))
+                    if file_name.endswith(".pssm")
+                ]
+    if cd_hit_folder_path and os.path.exists(os.path.join(cd_hit_folder_path, "cd-hit")):
+        existing_files.append(os.path.join(cd_hit_folder_path, "cd-hit"))
+    return existing_files
+
+
+def create_synthetic_datasets(
+    folder_path: str,
+    n_proteins: int = 10000,
+    n_go_terms: int = 10000,
+    n_chebi_terms: int = 2000,
+    n_organisms: int = 20,
+    mean_family_size: float = 5.0,
+    transporter_fraction: float = 0.1,
+    random_seed: int = 1,
+    pssm_folder_path: str = None,
+    cd_hit_folder_path: str = None,
+    overwrite: bool = False,
+    verbose: bool = True,
+) -> pd.Series:
+    """Writes synthetic uniprot, go, go_obo, chebi_obo and go_chebi datasets with save_df,
+    with the same columns and dtypes as the pickles from the preprocessing notebook.
+
+    Structure:
+        - GO and ChEBI are random DAGs with logarithmic depth, multiple parents and alt_ids.
+          The GO terms that subpred looks up by name (e.g. "transmembrane transporter activity") exist.
+        - Proteins belong to families of similar sequences (substitutions only), with lognormal lengths
+          and UniProt amino acid frequencies. Family sizes and organisms are skewed.
+        - Proteins inherit most of the GO terms of their family. Term popularity follows a Zipf distribution.
+          transporter_fraction of the families have a term below "transmembrane transporter activity".
+          Transporter terms that subset_pipeline could not compare with any other term are removed from GO.
+        - Transporter terms and some process terms are linked to ChEBI molecules, with SMILES strings.
+
+    Args:
+        folder_path (str): Output folder, the datasets_path of the pipeline. No default, since the default
+            datasets_path of the pipeline ("../data/datasets") contains the real datasets.
+        n_proteins (int, optional): Tested with 10^3 to 10^6. Defaults to 10000.
+        n_go_terms (int, optional): GO has about 43000 terms. Defaults to 10000.
+        n_chebi_terms (int, optional): Defaults to 2000.
+        n_organisms (int, optional): At least 5, the first ones are yeast, human, E. coli, A. thaliana, mouse.
+            Defaults to 20.
+        mean_family_size (float, optional): Defaults to 5.0.
+        transporter_fraction (float, optional): Fraction of protein families with transporter terms. Defaults to 0.1.
+        random_seed (int, optional): Defaults to 1.
+        pssm_folder_path (str, optional): If set, stub PSSM files for all transporters are written to the
+            subfolders that calculate_features reads, e.g. "../data/intermediate/blast". Defaults to None.
+        cd_hit_folder_path (str, optional): If set, a stand-in cd-hit executable is written to this folder.
+            Defaults to None.
+        overwrite (bool, optional): Replace existing datasets, PSSM files and cd-hit executables in these folders.
+            Otherwise, a FileExistsError is raised if any of them exist. Defaults to False.
+        verbose (bool, optional): Print the size of each dataset. Defaults to True.
+
+    Returns:
+        pd.Series: Number of rows/nodes of each dataset
+    """
+    assert n_organisms >= len(ORGANISM_IDS)
+    existing_files = __get_existing_files(folder_path, pssm_folder_path, cd_hit_folder_path)
+    if existing_files and not overwrite:
+        raise FileExistsError(
+            f"{len(existing_files)} files would be replaced, e.g. {existing_files[0]}. "
+            "Use overwrite=True to replace them."
+        )
+    rng = np.random.default_rng(random_seed)
+    os.makedirs(folder_path, exist_ok=True)
+
+    graph_go = __get_go_graph(n_go_terms, rng, data_version=f"synthetic/{random_seed}")
+    graph_chebi = __get_chebi_graph(n_chebi_terms, rng)
+
+    n_families = max(1, int(n_proteins / mean_family_size))
+    families = rng.choice(n_families, size=n_proteins, p=__get_popularity(n_families, rng, exponent=0.5))
+    family_lengths = np.clip(rng.lognormal(np.log(350), 0.6, n_families), 50, 3000).astype(np.int64)
+    # the real organisms are the most frequent ones
+    organism_weights = 1.0 / np.arange(1, n_organisms + 1)
+    family_organisms = rng.choice(n_organisms, size=n_families, p=organism_weights / organism_weights.sum())
+    organism_ids = np.array(
+        ORGANISM_IDS + [100000 + i for i in range(n_organisms - len(ORGANISM_IDS))]
+    )
+    accessions = __get_accessions(n_proteins)
+    # most family members are from the organism of the family
+    organism_codes = np.where(
+        rng.random(n_proteins) < 0.7,
+        family_organisms[families],
+        rng.choice(n_organisms, size=n_proteins),
+    )
+    has_gene_name = rng.random(n_proteins) < 0.9
+    df_uniprot = pd.DataFrame(
+        {
+            "gene_names": np.where(has_gene_name, [f"SYN{i}" for i in range(n_proteins)], None),
+            "protein_names": [f"Synthetic protein family {family}" for family in families],
+            "reviewed": rng.random(n_proteins) < 0.1,
+            "protein_existence": np.where(rng.random(n_proteins) < 0.15, 1, 2),
+            "sequence": __get_sequences(families, family_lengths, rng),
+            "organism_id": organism_ids[organism_codes],
+        },
+        index=pd.Index(accessions, dtype="string", name="Uniprot"),
+    ).astype({"gene_names": "string", "protein_names": "string", "sequence": "string"})
+
+    df_go = __get_go_annotations(graph_go, families, n_families, accessions, transporter_fraction, rng)
+    df_go = __remove_go_terms(
+        graph_go, df_go, __get_unpaired_transporter_terms(graph_go, df_uniprot, df_go)
+    )
+    df_go_chebi = __get_go_chebi(graph_go, graph_chebi, rng)
+
+    save_df(df_uniprot, "uniprot", folder_path=folder_path)
+    save_df(df_go, "go", folder_path=folder_path)
+    save_df(df_go_chebi, "go_chebi", folder_path=folder_path)
+    save_df(graph_go, "go_obo", folder_path=folder_path)
+    save_df(graph_chebi, "chebi_obo", folder_path=folder_path)
+
+    if pssm_folder_path:
+        transporter_terms = nx.ancestors(graph_go, GO_ROOT_TRANSPORTERS) | {GO_ROOT_TRANSPORTERS}
+        transporters = df_go[df_go.go_id.isin(transporter_terms)].Uniprot.unique()
+        # same files in all folders, the scores are random anyway
+        write_stub_pssm_files(
+            df_uniprot.sequence.loc[transporters],
+            f"{pssm_folder_path}/{PSSM_FOLDER_NAMES[0]}",
+            random_seed=random_seed,
+        )
+        for pssm_folder_name in PSSM_FOLDER_NAMES[1:]:
+            shutil.copytree(
+                f"{pssm_folder_path}/{PSSM_FOLDER_NAMES[0]}",
+                f"{pssm_folder_path}/{pssm_folder_name}",
+                dirs_exist_ok=True,
+            )
+    if cd_hit_folder_path:
+        write_stub_cd_hit(cd_hit_folder_path)
+
+    dataset_sizes = pd.Series(
+        {
+            "uniprot": len(df_uniprot),
+            "go": len(df_go),
+            "go_chebi": len(df_go_chebi),
+            "go_obo": graph_go.number_of_nodes(),
+            "chebi_obo": graph_chebi.number_of_nodes(),
+        },
+        name="n_rows",
+    )
+    if verbose:
+        print(dataset_sizes.to_string())
+    return dataset_sizes
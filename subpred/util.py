@@ -1,4 +1,5 @@
 import os
+import shutil
 from pathlib import Path
 import pandas as pd
 import networkx as nx
@@ -44,6 +45,22 @@ def load_df(dataset_name: str, folder_path: str = "../data/datasets", **kwargs):
                     return pickle.load(pickle_file)
 
 
+# Temporary files that are read many times (cd-hit input, shared feature and kernel matrices)
+# are placed in memory if possible
+TMPFS_FOLDER = "/dev/shm"
+
+
+def get_tmp_folder(required_bytes: int = 0):
+    """TMPFS_FOLDER if it is writable and has space for required_bytes (with 10% margin),
+    otherwise None, i.e. the default folder of tempfile.
+    In containers, /dev/shm is often only 64MB."""
+    if not (os.path.isdir(TMPFS_FOLDER) and os.access(TMPFS_FOLDER, os.W_OK)):
+        return None
+    if shutil.disk_usage(TMPFS_FOLDER).free < required_bytes * 1.1:
+        return None
+    return TMPFS_FOLDER
+
+
 # import numpy as np
 # from sklearn.pipeline import make_pipeline
 # from sklearn.preprocessing import StandardScaler